@@ -0,0 +1,65 @@
+"""Ingest time, index size and retrieval quality of per-row versus row-group documents.
+
+Answer quality is approximated without a model: the share of claim-number questions whose
+claim is in the retrieved context, and how many characters of context that takes.
+Run from the repository root:  python -m benchmarks.bench_chunking --rows 5000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from benchmarks.bench_retrieval import HashingEmbedding, claim_queries
+from benchmarks.bench_schema_layout import directory_size
+from benchmarks.synthetic import write_claims_folder
+from src.keyword_index import KeywordIndex, keyword_index_path
+from src.query_engine import build_retriever
+from src.vector_store import setup_vector_store
+
+LAYOUTS = (
+    ("one row per document", 1, None),
+    ("10 rows per document", 10, None),
+    ("rows of one policy", 20, "NUM_POLICE"),
+)
+
+
+def claim_recall(retriever, queries):
+    hits, characters = 0, 0
+    for query_str, claim in queries:
+        context = "\n".join(node.get_content() for node in retriever.retrieve(query_str))
+        hits += claim in context
+        characters += len(context)
+    return hits / len(queries), characters / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_folder = Path(tmp) / "csv"
+        # About three claims per policy, written sorted by policy as exports usually are
+        write_claims_folder(csv_folder, args.files, args.rows, policies=max(1, args.rows // 3))
+        queries = claim_queries(csv_folder, args.queries)
+
+        for label, chunk_rows, chunk_key in LAYOUTS:
+            db_path = Path(tmp) / f"chunks_{chunk_rows}_{chunk_key}"
+            keyword_index = KeywordIndex(keyword_index_path(str(db_path), "bench"))
+            start = time.perf_counter()
+            index = setup_vector_store(str(csv_folder), embed_model=HashingEmbedding(), db_path=str(db_path),
+                                       collection_name="bench", keyword_index=keyword_index, backend="chroma",
+                                       chunk_rows=chunk_rows, chunk_key=chunk_key)
+            seconds = time.perf_counter() - start
+            documents = index.vector_store.client.count()
+
+            vector_recall, _ = claim_recall(build_retriever(index), queries)
+            hybrid_recall, characters = claim_recall(build_retriever(index, keyword_index), queries)
+            print(f"{label:<22} {seconds:7.2f} s  {documents:>7} documents  "
+                  f"{directory_size(db_path) / 2 ** 20:7.1f} MiB  claim in context: vector {vector_recall:6.1%}, "
+                  f"hybrid {hybrid_recall:6.1%}  {characters:7.0f} context chars/query")
+
+
+if __name__ == "__main__":
+    main()
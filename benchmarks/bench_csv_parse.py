@@ -0,0 +1,45 @@
+"""Rows per second of the row-wise, columnar and process-pool CSV parsing modes on the same file.
+
+Run from the repository root:  python -m benchmarks.bench_csv_parse
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from benchmarks.synthetic import write_claims_csv
+from src.data_loader import ImprovedCSVReader
+
+
+def parse(file, columnar, workers=1, chunk_bytes=None):
+    options = {"chunk_bytes": chunk_bytes} if chunk_bytes else {}
+    start = time.perf_counter()
+    with ImprovedCSVReader(columnar=columnar, workers=workers, **options) as reader:
+        texts = [doc.text for doc in reader.iter_documents(file)]
+    return texts, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-bytes", type=int, default=4 << 20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file = Path(tmp) / "claims.csv"
+        write_claims_csv(file, args.rows)
+
+        row_texts, row_time = parse(file, columnar=False)
+        columnar_texts, columnar_time = parse(file, columnar=True)
+        pool_texts, pool_time = parse(file, columnar=True, workers=args.workers,
+                                      chunk_bytes=args.chunk_bytes)
+
+    print(f"row-wise: {args.rows / row_time:>10.0f} rows/s")
+    print(f"columnar: {args.rows / columnar_time:>10.0f} rows/s ({row_time / columnar_time:.1f}x)")
+    print(f"{args.workers} workers: {args.rows / pool_time:>7.0f} rows/s ({row_time / pool_time:.1f}x)")
+    print(f"identical output: {row_texts == columnar_texts == pool_texts}")
+
+
+if __name__ == "__main__":
+    main()
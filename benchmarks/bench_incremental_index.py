@@ -0,0 +1,52 @@
+"""Compare a full index build with incremental re-syncs of the same folder.
+
+Run from the repository root:  python -m benchmarks.bench_incremental_index
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from llama_index.core import MockEmbedding
+from benchmarks.synthetic import write_claims_folder, mutate_claims_csv
+from src.vector_store import setup_vector_store
+
+
+class CountingEmbedding(MockEmbedding):
+    calls: int = 0
+
+    def _get_text_embeddings(self, texts):
+        self.calls += len(texts)
+        return super()._get_text_embeddings(texts)
+
+
+def timed_sync(label, csv_folder, db_path):
+    embed_model = CountingEmbedding(embed_dim=384)
+    start = time.perf_counter()
+    setup_vector_store(str(csv_folder), embed_model=embed_model, db_path=str(db_path),
+                       collection_name="bench")
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.2f} s  {embed_model.calls:>9} rows embedded")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--change", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_folder, db_path = Path(tmp) / "csv", Path(tmp) / "chroma"
+        write_claims_folder(csv_folder, args.files, args.rows)
+
+        full = timed_sync("full build", csv_folder, db_path)
+        unchanged = timed_sync("restart, nothing changed", csv_folder, db_path)
+        mutate_claims_csv(csv_folder / "claims_000.csv", args.change)
+        changed = timed_sync(f"restart, {args.change:.0%} of one file", csv_folder, db_path)
+
+        print(f"speedup (unchanged): {full / unchanged:.1f}x, (changed): {full / changed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Per-stage timings of ingestion, retrieval and generation, as JSON, with an optional regression check.
+
+Runs the production code paths on synthetic claim CSVs and legal texts, with local stubs
+in place of the embedding model (hashing embedder), Ollama (llama_index MockLLM) and the
+instruction generator's model, so it needs no download or server. Stages are timed by the
+hooks in src/timing.py; section splitting and QA generation are skipped when torch,
+transformers or the NLTK punkt data are not installed.
+Run from the repository root:
+    python -m benchmarks.bench_pipeline --output timings.json
+    python -m benchmarks.bench_pipeline --baseline timings.json --tolerance 0.25
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from llama_index.core.llms import MockLLM
+from benchmarks.bench_retrieval import HashingEmbedding, claim_queries
+from benchmarks.synthetic import write_claims_folder, write_legal_jsonl, write_metadata_json
+from src.document_processor import load_metadata
+from src.keyword_index import KeywordIndex, keyword_index_path
+from src.query_engine import setup_query_engine, stream_response
+from src.timing import StageTimings, disable_timings, enable_timings, timed
+from src.vector_store import setup_vector_store
+
+# Stages faster than this in the baseline are too noisy to compare
+MIN_COMPARED_SECONDS = 0.01
+GENERATOR_SRC = Path(__file__).resolve().parents[1] / "instruct_data_gen" / "src"
+
+
+class StubTokenizer:
+    """Word-level stand-in for the chat tokenizer, padding on the left like the real one."""
+
+    pad_token_id = 0
+
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=True):
+        return "".join(f"<|{message['role']}|>{message['content']}" for message in messages) + "<|assistant|>"
+
+    def __call__(self, texts, add_special_tokens=True):
+        return SimpleNamespace(input_ids=[[hash(word) % 50000 + 1 for word in text.split()] for text in texts])
+
+    def pad(self, encoded, return_tensors="pt"):
+        import torch
+
+        width = max(len(ids) for ids in encoded["input_ids"])
+        return {
+            "input_ids": torch.tensor([[0] * (width - len(ids)) + ids for ids in encoded["input_ids"]]),
+            "attention_mask": torch.tensor([[0] * (width - len(ids)) + [1] * len(ids) for ids in encoded["input_ids"]]),
+        }
+
+    def batch_decode(self, generated_ids, skip_special_tokens=True):
+        return ["Question: Quel est le délai de déclaration ? Answer: Cinq jours." for _ in generated_ids]
+
+
+class StubModel:
+    """Answers every batch after a fixed latency, standing in for model.generate."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def generate(self, input_ids, max_new_tokens=512, **kwargs):
+        import torch
+
+        time.sleep(self.latency)
+        return torch.cat([input_ids, torch.ones(input_ids.shape[0], 16, dtype=input_ids.dtype)], dim=1)
+
+
+def run_ingestion_and_queries(tmp: Path, args):
+    csv_folder = tmp / "csv"
+    write_claims_folder(csv_folder, args.files, args.rows)
+    write_metadata_json(csv_folder)
+    db_path = str(tmp / "chroma")
+    keyword_index = KeywordIndex(keyword_index_path(db_path, "bench"))
+    index = setup_vector_store(str(csv_folder), embed_model=HashingEmbedding(), db_path=db_path,
+                               collection_name="bench", keyword_index=keyword_index)
+
+    query_engine = setup_query_engine(index, load_metadata(str(csv_folder)), keyword_index=keyword_index,
+                                      llm=MockLLM(max_tokens=64))
+    for query_str, _ in claim_queries(csv_folder, args.queries):
+        stream_response(query_engine, query_str)
+
+
+def run_generation(tmp: Path, args):
+    sys.path.insert(0, str(GENERATOR_SRC))
+    try:
+        from instruction_dataset_generator import InstructionDatasetGenerator
+        generator = InstructionDatasetGenerator(load_model=False, tokenizer=StubTokenizer())
+        generator.split_into_coherent_sections("Article 1. Vérification des données de découpage.")
+    except (ImportError, LookupError) as e:
+        print(f"Skipping section splitting and QA generation: {e}", file=sys.stderr)
+        return
+    generator.model = StubModel(args.generation_latency)
+
+    input_file = tmp / "legal.jsonl"
+    write_legal_jsonl(input_file, args.documents, args.articles)
+    sections = []
+    for doc in generator.read_jsonl(str(input_file)):
+        with timed('section_split'):
+            sections.extend(generator.split_into_coherent_sections(doc['messages']))
+    with timed('qa_generation', len(sections)):
+        generator.generate_qa_pairs(sections, batch_size=args.batch_size, reuse_prefix=False)
+
+
+def regressions(report, baseline, tolerance):
+    # Stages whose seconds per item grew by more than tolerance over the baseline
+    slower = {}
+    for stage, current in report.items():
+        before = baseline.get(stage)
+        if not before or not before['items'] or not current['items'] or before['seconds'] < MIN_COMPARED_SECONDS:
+            continue
+        ratio = (current['seconds'] / current['items']) / (before['seconds'] / before['items'])
+        if ratio > 1 + tolerance:
+            slower[stage] = ratio
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--rows", type=int, default=2000, help="claim rows per CSV file")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--documents", type=int, default=20, help="synthetic legal documents")
+    parser.add_argument("--articles", type=int, default=40, help="articles per legal document")
+    parser.add_argument("--batch-size", type=int, default=8, help="sections per generate call")
+    parser.add_argument("--generation-latency", type=float, default=0.0, help="stub seconds per generate call")
+    parser.add_argument("--output", default=None, help="JSON file for the results, printed when omitted")
+    parser.add_argument("--baseline", default=None, help="earlier --output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown per item, 0.25 is 25%%")
+    args = parser.parse_args()
+
+    timings = enable_timings(StageTimings())
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            run_ingestion_and_queries(Path(tmp), args)
+            run_generation(Path(tmp), args)
+    finally:
+        disable_timings()
+
+    results = {'parameters': vars(args), 'stages': timings.report()}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            slower = regressions(results['stages'], json.load(f)['stages'], args.tolerance)
+        for stage, ratio in slower.items():
+            print(f"Regression: {stage} takes {ratio:.2f}x the baseline time per item", file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
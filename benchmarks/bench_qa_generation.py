@@ -0,0 +1,46 @@
+"""Sections per minute of InstructionDatasetGenerator, one section per generate call versus batched.
+
+Loads the generator's model, so it needs transformers, torch and the model weights.
+Run from the repository root:
+    python -m benchmarks.bench_qa_generation --sections 16 --batch-size 8
+"""
+import argparse
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+
+GENERATOR_DIR = Path(__file__).resolve().parents[1] / "instruct_data_gen"
+sys.path.insert(0, str(GENERATOR_DIR / "src"))
+
+from instruction_dataset_generator import InstructionDatasetGenerator  # noqa: E402
+
+
+def sample_sections(generator, input_file: Path, count: int):
+    # Reads only as many documents as the first `count` sections need
+    return [section for _, section, _ in islice(generator.iter_sections(generator.read_jsonl(str(input_file))), count)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="Qwen/Qwen2.5-1.5B-Instruct")
+    parser.add_argument("--input", default=str(GENERATOR_DIR / "data" / "trainingtext__.jsonl"))
+    parser.add_argument("--sections", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    generator = InstructionDatasetGenerator(args.model)
+    sections = sample_sections(generator, Path(args.input), args.sections)
+
+    baseline = None
+    for label, batch_size in (("one section per call", 1), (f"batches of {args.batch_size}", args.batch_size)):
+        start = time.perf_counter()
+        pairs = generator.generate_qa_pairs(sections, batch_size=batch_size)
+        per_minute = 60 * len(sections) / (time.perf_counter() - start)
+        baseline = baseline or per_minute
+        errors = sum(question == "ERROR" for question, _ in pairs)
+        print(f"{label:<22} {per_minute:8.1f} sections/min ({per_minute / baseline:.1f}x), {errors} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Prefill time of InstructionDatasetGenerator with and without the cached system prompt prefix.
+
+Prefill is timed as a greedy generate of a single token per prompt. The same batches are then
+generated greedily for --tokens tokens both ways to check that the outputs match.
+Needs transformers, torch and the model weights. Run from the repository root:
+    python -m benchmarks.bench_qa_prefix --sections 16 --batch-size 8
+"""
+import argparse
+import time
+import torch
+from benchmarks.bench_qa_generation import GENERATOR_DIR, sample_sections
+from instruction_dataset_generator import InstructionDatasetGenerator
+
+
+def generate(generator, batches, reuse_prefix, max_new_tokens):
+    outputs, seconds = [], 0.0
+    for batch in batches:
+        model_inputs = generator.model_inputs(batch, reuse_prefix, num_beams=1)
+        start = time.perf_counter()
+        with torch.no_grad():
+            generated_ids = generator.model.generate(**model_inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                                     num_beams=1, pad_token_id=generator.tokenizer.pad_token_id)
+        seconds += time.perf_counter() - start
+        outputs.extend(generator.tokenizer.batch_decode(generated_ids[:, model_inputs['input_ids'].shape[1]:],
+                                                        skip_special_tokens=True))
+    return outputs, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="Qwen/Qwen2.5-1.5B-Instruct")
+    parser.add_argument("--input", default=str(GENERATOR_DIR / "data" / "trainingtext__.jsonl"))
+    parser.add_argument("--sections", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--tokens", type=int, default=32, help="greedy tokens compared between the two ways")
+    args = parser.parse_args()
+
+    generator = InstructionDatasetGenerator(args.model)
+    sections = sample_sections(generator, args.input, args.sections)
+    input_ids = sorted(generator.tokenizer([generator.build_prompt(section) for section in sections]).input_ids, key=len)
+    batches = [input_ids[start:start + args.batch_size] for start in range(0, len(input_ids), args.batch_size)]
+    prompt_tokens = sum(map(len, input_ids)) / len(input_ids)
+    print(f"{len(sections)} sections, {prompt_tokens:.0f} prompt tokens on average, "
+          f"{len(generator.prefix_ids)} of them the cached prefix")
+
+    _, full = generate(generator, batches, False, 1)
+    _, cached = generate(generator, batches, True, 1)
+    print(f"prefill, whole prompt        {1000 * full / len(sections):8.1f} ms/section")
+    print(f"prefill, cached prefix       {1000 * cached / len(sections):8.1f} ms/section ({full / cached:.1f}x)")
+
+    expected, _ = generate(generator, batches, False, args.tokens)
+    reused, _ = generate(generator, batches, True, args.tokens)
+    same = sum(a == b for a, b in zip(expected, reused))
+    print(f"identical greedy outputs over {args.tokens} tokens: {same}/{len(sections)}")
+
+
+if __name__ == "__main__":
+    main()
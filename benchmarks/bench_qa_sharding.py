@@ -0,0 +1,56 @@
+"""Throughput of sharded instruction generation with 1 to K worker processes on this machine.
+
+Each worker loads its own copy of the model and gets cores / workers torch threads, so a
+small model (the default) keeps the run short. Needs transformers, torch and the weights.
+Run from the repository root:
+    python -m benchmarks.bench_qa_sharding --documents 4 --max-workers 4
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+GENERATOR_DIR = Path(__file__).resolve().parents[1] / "instruct_data_gen"
+sys.path.insert(0, str(GENERATOR_DIR / "src"))
+
+from instruction_dataset_generator import merge_shards, run_sharded  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="Qwen/Qwen2.5-0.5B-Instruct")
+    parser.add_argument("--input", default=str(GENERATOR_DIR / "data" / "trainingtext__.jsonl"))
+    parser.add_argument("--documents", type=int, default=4, help="documents taken from the input")
+    parser.add_argument("--max-workers", type=int, default=4)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = Path(tmp) / "input.jsonl"
+        with open(args.input, 'r', encoding='utf-8') as src, open(input_file, 'w', encoding='utf-8') as dst:
+            for _, line in zip(range(args.documents), src):
+                dst.write(line)
+
+        baseline = None
+        workers = 1
+        while workers <= args.max_workers:
+            shard_dir = Path(tmp) / f"shards_{workers}"
+            output_file = Path(tmp) / f"merged_{workers}.jsonl"
+            start = time.perf_counter()
+            run_sharded(str(input_file), str(shard_dir), workers, max(1, cores // workers), model_name=args.model)
+            merge_shards(str(input_file), str(shard_dir), workers, str(output_file), model_name=args.model)
+            elapsed = time.perf_counter() - start
+            with open(output_file, 'r', encoding='utf-8') as f:
+                sections = sum(1 for line in f if json.loads(line)['instruction'] != "ERROR")
+            per_minute = 60 * sections / elapsed
+            baseline = baseline or per_minute
+            print(f"{workers} workers x {max(1, cores // workers)} threads: {sections} sections in {elapsed:7.1f} s, "
+                  f"{per_minute:6.1f} sections/min ({per_minute / baseline:.2f}x)")
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Recall and latency of vector-only versus hybrid (BM25 + vector, pre-filtered) retrieval.
+
+Uses a deterministic hashing embedder so the comparison runs without a model download.
+Run from the repository root:  python -m benchmarks.bench_retrieval --rows 5000
+"""
+import argparse
+import hashlib
+import random
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from benchmarks.synthetic import write_claims_folder
+from src.data_loader import iter_row_blocks
+from src.keyword_index import KeywordIndex, keyword_index_path
+from src.query_engine import build_retriever
+from src.vector_store import setup_vector_store
+
+
+class HashingEmbedding(BaseEmbedding):
+    """Bag of hashed word tokens, normalized; similar texts share dimensions."""
+
+    embed_dim: int = 384
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.embed_dim, dtype=np.float32)
+        for token in re.findall(r'\w+', text.lower()):
+            vector[int(hashlib.md5(token.encode()).hexdigest(), 16) % self.embed_dim] += 1.0
+        return (vector / (np.linalg.norm(vector) + 1e-12)).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def claim_queries(csv_folder: Path, count: int, seed: int = 0):
+    # (question, claim number it should retrieve) for claims picked at random
+    rows = [row for file in sorted(csv_folder.glob('*.csv'))
+            for _, block in iter_row_blocks(file) for row in block]
+    rng = random.Random(seed)
+    queries = []
+    for row in rng.sample(rows, count):
+        claim, _, garage, _, occurred = row[:5]
+        queries.append((f"Montant du sinistre {claim} ({garage}, survenu le {occurred})", claim))
+    return queries
+
+
+def evaluate(retriever, queries):
+    hits, latencies = 0, []
+    for query_str, claim in queries:
+        start = time.perf_counter()
+        nodes = retriever.retrieve(query_str)
+        latencies.append(time.perf_counter() - start)
+        hits += any(claim in node.get_content() for node in nodes)
+    latencies.sort()
+    return hits / len(queries), latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_folder = Path(tmp) / "csv"
+        write_claims_folder(csv_folder, args.files, args.rows)
+        db_path = str(Path(tmp) / "chroma")
+        keyword_index = KeywordIndex(keyword_index_path(db_path, "bench"))
+        index = setup_vector_store(str(csv_folder), embed_model=HashingEmbedding(), db_path=db_path,
+                                   collection_name="bench", keyword_index=keyword_index)
+        queries = claim_queries(csv_folder, args.queries)
+
+        for label, retriever in (("vector only", build_retriever(index)),
+                                 ("hybrid", build_retriever(index, keyword_index))):
+            recall, p50, p99 = evaluate(retriever, queries)
+            print(f"{label:<12} recall@k {recall:6.1%}  p50 {p50 * 1000:7.1f} ms  p99 {p99 * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Index size and ingestion time with the schema inlined in every row versus stored once per file.
+
+Run from the repository root:  python -m benchmarks.bench_schema_layout
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from llama_index.core import MockEmbedding
+from benchmarks.synthetic import write_claims_folder, write_metadata_json
+from src.vector_store import setup_vector_store
+
+
+class CountingEmbedding(MockEmbedding):
+    characters: int = 0
+
+    def _get_text_embeddings(self, texts):
+        self.characters += sum(len(text) for text in texts)
+        return super()._get_text_embeddings(texts)
+
+
+def directory_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def build(csv_folder, db_path, inline_schema):
+    embed_model = CountingEmbedding(embed_dim=384)
+    start = time.perf_counter()
+    setup_vector_store(str(csv_folder), embed_model=embed_model, db_path=str(db_path),
+                       collection_name="bench", inline_schema=inline_schema)
+    return time.perf_counter() - start, embed_model.characters, directory_size(db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_folder = Path(tmp) / "csv"
+        write_claims_folder(csv_folder, args.files, args.rows)
+        write_metadata_json(csv_folder)
+
+        for label, inline_schema in (("schema in every row", True), ("schema once per file", False)):
+            seconds, characters, size = build(csv_folder, Path(tmp) / label.replace(" ", "_"),
+                                              inline_schema)
+            print(f"{label:<22} {seconds:8.2f} s  {characters:>12} chars embedded  "
+                  f"{size / 2 ** 20:8.1f} MiB on disk")
+
+
+if __name__ == "__main__":
+    main()
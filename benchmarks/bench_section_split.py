@@ -0,0 +1,52 @@
+"""Documents per second and section sizes of the token-budgeted splitter versus the old word budget.
+
+Section sizes are measured in model tokens, the unit the generation prompt is limited by.
+Needs torch and transformers, which the generator module imports (no model is loaded, only the
+tokenizer is used), and the NLTK punkt data. Run from the repository root:
+    python -m benchmarks.bench_section_split
+"""
+import argparse
+import time
+from benchmarks.bench_qa_generation import GENERATOR_DIR
+from instruction_dataset_generator import SECTION_TOKENS, InstructionDatasetGenerator
+from nltk.tokenize import sent_tokenize
+
+
+def word_budget_sections(text, max_words=200):
+    # The splitter as it was before token budgets: whitespace words, one sentence at a time
+    sections, current_section, current_length = [], [], 0
+    for sentence in sent_tokenize(text, language='french'):
+        sentence_length = len(sentence.split())
+        if current_length + sentence_length > max_words and current_section:
+            sections.append(' '.join(current_section))
+            current_section, current_length = [sentence], sentence_length
+        else:
+            current_section.append(sentence)
+            current_length += sentence_length
+    if current_section:
+        sections.append(' '.join(current_section))
+    return sections
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="Qwen/Qwen2.5-1.5B-Instruct", help="tokenizer the budget is counted in")
+    parser.add_argument("--input", default=str(GENERATOR_DIR / "data" / "trainingtext__.jsonl"))
+    args = parser.parse_args()
+
+    generator = InstructionDatasetGenerator(args.model, load_model=False)
+    texts = [doc['messages'] for doc in generator.read_jsonl(args.input)]
+
+    for label, split in (("200 words", word_budget_sections),
+                         (f"{SECTION_TOKENS} tokens", generator.split_into_coherent_sections)):
+        start = time.perf_counter()
+        sections = [section for text in texts for section in split(text)]
+        elapsed = time.perf_counter() - start
+        tokens = sorted(len(ids) for ids in generator.tokenizer(sections, add_special_tokens=False).input_ids)
+        over = sum(length > SECTION_TOKENS for length in tokens)
+        print(f"{label:<11} {len(texts) / elapsed:8.1f} documents/s  {len(sections):6} sections  tokens per section: "
+              f"median {tokens[len(tokens) // 2]}, max {tokens[-1]}, {over} over {SECTION_TOKENS}")
+
+
+if __name__ == "__main__":
+    main()
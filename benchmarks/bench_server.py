@@ -0,0 +1,85 @@
+"""Queries per second and p50/p99 latency of the query server against a stub LLM.
+
+Run from the repository root:  python -m benchmarks.bench_server --clients 32
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from llama_index.core import MockEmbedding
+from benchmarks.synthetic import write_claims_folder
+from src.query_engine import build_text_qa_template, build_retriever
+from src.server import OllamaClient, QueryService, serve
+from src.vector_store import setup_vector_store
+
+
+class StubOllamaClient(OllamaClient):
+    def __init__(self, latency: float, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    async def generate(self, prompt: str) -> str:
+        await asyncio.sleep(self.latency)
+        return f"Stub answer from a {len(prompt)} character prompt"
+
+
+async def client(port, requests, latencies, statuses):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for i in range(requests):
+        body = json.dumps({'query': f"Sinistres du garage Ennasr numero {i}"}).encode()
+        start = time.perf_counter()
+        writer.write(f"POST /query HTTP/1.1\r\nHost: bench\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while (line := await reader.readline()) != b"\r\n":
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+    writer.close()
+
+
+async def run(index, args):
+    llm_client = StubOllamaClient(args.latency, concurrency=args.concurrency)
+    service = QueryService(build_retriever(index), build_text_qa_template(), llm_client)
+    ready = asyncio.Event()
+    server = asyncio.create_task(serve(service, port=args.port, ready=ready))
+    await ready.wait()
+
+    latencies, statuses = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(args.port, args.requests, latencies, statuses)
+                           for _ in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    server.cancel()
+    await llm_client.aclose()
+
+    latencies.sort()
+    print(f"{len(latencies)} queries in {elapsed:.2f} s: {len(latencies) / elapsed:.1f} queries/s")
+    print(f"p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, statuses {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--concurrency", type=int, default=4, help="generations in flight")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub generation seconds")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_folder = Path(tmp) / "csv"
+        write_claims_folder(csv_folder, 1, 2000)
+        index = setup_vector_store(str(csv_folder), embed_model=MockEmbedding(embed_dim=384),
+                                   db_path=str(Path(tmp) / "chroma"), collection_name="bench")
+        asyncio.run(run(index, args))
+
+
+if __name__ == "__main__":
+    main()
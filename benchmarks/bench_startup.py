@@ -0,0 +1,66 @@
+"""Time to first prompt of main.py for a cold build, a full restart and a --fast-start restart.
+
+Each start runs main.py in a fresh interpreter against a synthetic CSV folder, with the
+paths in config.py pointed at a temporary directory, and is timed from process launch
+until the query prompt is printed. Needs the embedding model to be available locally.
+Run from the repository root:  python -m benchmarks.bench_startup --rows 5000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from benchmarks.synthetic import write_claims_folder, write_metadata_json
+
+PROMPT = b"Enter your query"
+LAUNCHER = """
+import os, sys, config
+tmp = sys.argv.pop(1)
+config.CSV_FOLDER = os.path.join(tmp, "csv")
+config.CHROMA_DB_PATH = os.path.join(tmp, "chroma")
+config.CHROMA_COLLECTION_NAME = "bench"
+config.STRUCTURED_DB_PATH = os.path.join(config.CHROMA_DB_PATH, "claims.sqlite")
+config.RESPONSE_CACHE_PATH = os.path.join(config.CHROMA_DB_PATH, "response_cache.json")
+config.QUERY_RESULTS_CSV = os.path.join(tmp, "query_results.csv")
+import main
+main.main()
+"""
+
+
+def time_to_prompt(tmp: str, *flags: str) -> float:
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", LAUNCHER, tmp, *flags],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b""
+    while PROMPT not in output:
+        chunk = os.read(process.stdout.fileno(), 4096)
+        if not chunk:
+            raise RuntimeError(f"main.py exited before the prompt:\n{output.decode(errors='replace')}")
+        output += chunk
+    elapsed = time.perf_counter() - start
+    process.communicate(b"exit\n")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3, help="restarts timed per mode")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_folder = Path(tmp) / "csv"
+        write_claims_folder(csv_folder, args.files, args.rows)
+        write_metadata_json(csv_folder)
+
+        print(f"{'cold build':<18} {time_to_prompt(tmp):8.2f} s")
+        for label, flags in (("full restart", ()), ("fast-start restart", ("--fast-start",))):
+            seconds = min(time_to_prompt(tmp, *flags) for _ in range(args.repeat))
+            print(f"{label:<18} {seconds:8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Footprint, recall@k and query latency of the Chroma and compact (int8) vector backends.
+
+Recall is measured against an exact float32 search over the same rows. Uses the
+hashing embedder from bench_retrieval so no model download is needed.
+Run from the repository root:  python -m benchmarks.bench_vector_store --rows 20000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from benchmarks.bench_retrieval import HashingEmbedding, claim_queries
+from benchmarks.bench_schema_layout import directory_size
+from benchmarks.synthetic import write_claims_folder
+from src.compact_store import CompactVectorStore, compact_store_path
+from src.vector_store import setup_vector_store
+from llama_index.core import VectorStoreIndex
+
+
+def search(index, queries, top_k):
+    retriever = index.as_retriever(similarity_top_k=top_k)
+    results, latencies = [], []
+    for query_str, _ in queries:
+        start = time.perf_counter()
+        nodes = retriever.retrieve(query_str)
+        latencies.append(time.perf_counter() - start)
+        results.append({node.node.ref_doc_id for node in nodes})
+    latencies.sort()
+    return results, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_folder = Path(tmp) / "csv"
+        write_claims_folder(csv_folder, args.files, args.rows)
+        queries = claim_queries(csv_folder, args.queries)
+        embed_model = HashingEmbedding()
+
+        indexes = {}
+        for backend in ("chroma", "compact"):
+            db_path = Path(tmp) / backend
+            indexes[backend] = setup_vector_store(str(csv_folder), embed_model=embed_model, db_path=str(db_path),
+                                                  collection_name="bench", backend=backend)
+        # Re-ranking every row turns the compact store into an exact float32 search
+        exact_store = CompactVectorStore(compact_store_path(str(Path(tmp) / "compact"), "bench"),
+                                         rerank_candidates=10 ** 12)
+        exact, _, _ = search(VectorStoreIndex.from_vector_store(exact_store, embed_model=embed_model),
+                             queries, args.top_k)
+
+        rows = exact_store.count()
+        dim = len(embed_model.get_query_embedding("dimension"))
+        print(f"{rows} rows of {dim} dimensions, float32 vectors alone: {rows * dim * 4 / 2 ** 20:.1f} MiB")
+        for backend, index in indexes.items():
+            results, p50, p99 = search(index, queries, args.top_k)
+            recall = sum(len(found & truth) for found, truth in zip(results, exact)) / \
+                sum(len(truth) for truth in exact)
+            if backend == "compact":
+                scanned = f"{index.vector_store.memory_bytes() / 2 ** 20:6.1f} MiB scanned per query"
+            else:
+                scanned = "HNSW graph and float32 vectors in memory"
+            print(f"{backend:<8} {directory_size(Path(tmp) / backend) / 2 ** 20:8.1f} MiB on disk  {scanned}  "
+                  f"recall@{args.top_k} {recall:6.1%}  p50 {p50 * 1000:6.1f} ms  p99 {p99 * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
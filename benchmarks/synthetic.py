@@ -0,0 +1,127 @@
+import csv
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+CLAIM_HEADERS = [
+    "NUM_SINISTRE", "NUM_POLICE", "GARAGE", "MONTANT", "DATE_SURVENANCE",
+    "DATE_DECLARATION", "DATE_EXECUTION",
+]
+CLAIM_COLUMNS = {
+    "NUM_SINISTRE": ("Identifiant unique du sinistre", "string"),
+    "NUM_POLICE": ("Numero de la police d'assurance du vehicule sinistre", "string"),
+    "GARAGE": ("Garage agree ayant pris en charge la reparation du vehicule", "string"),
+    "MONTANT": ("Montant total indemnise au titre du sinistre, en dinars", "float"),
+    "DATE_SURVENANCE": ("Date a laquelle l'accident s'est produit", "date"),
+    "DATE_DECLARATION": ("Date de declaration du sinistre par l'assure", "date"),
+    "DATE_EXECUTION": ("Horodatage de l'extraction des donnees", "datetime"),
+}
+GARAGES = ["Garage Ennasr", "Auto Sfax", "Carrosserie Sousse", "Garage du Lac", "Meca Bizerte"]
+BASE_DATE = datetime(2020, 1, 1)
+
+
+def claim_row(rng: random.Random, claim_number: int, policies: int = 10 ** 7):
+    occurred = BASE_DATE + timedelta(days=rng.randrange(1500))
+    declared = occurred + timedelta(days=rng.randrange(30))
+    executed = declared + timedelta(seconds=rng.randrange(86400 * 10))
+    return [
+        f"SIN{claim_number:09d}",
+        f"POL{rng.randrange(policies):07d}",
+        rng.choice(GARAGES),
+        f"{rng.uniform(100, 20000):.2f}",
+        occurred.strftime('%d/%m/%Y'),
+        declared.strftime('%d/%m/%Y'),
+        executed.strftime('%d%b%y:%H:%M:%S').upper(),
+    ]
+
+
+def write_claims_csv(path: Path, rows: int, seed: int = 0, first_claim: int = 0, policies: int = 0):
+    # With `policies`, claims are spread over that many policies and written sorted by policy
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='latin-1') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(CLAIM_HEADERS)
+        if policies:
+            writer.writerows(sorted((claim_row(rng, first_claim + i, policies) for i in range(rows)),
+                                    key=lambda row: row[1]))
+            return
+        for i in range(rows):
+            writer.writerow(claim_row(rng, first_claim + i))
+
+
+def write_claims_folder(folder: Path, files: int, rows_per_file: int, seed: int = 0, policies: int = 0):
+    folder.mkdir(parents=True, exist_ok=True)
+    for n in range(files):
+        write_claims_csv(folder / f"claims_{n:03d}.csv", rows_per_file, seed + n, n * rows_per_file, policies)
+
+
+def mutate_claims_csv(path: Path, fraction: float, seed: int = 0):
+    # Rewrites a fraction of rows in place, appends the same number and drops as many
+    rng = random.Random(seed)
+    with open(path, 'r', newline='', encoding='latin-1') as f:
+        rows = list(csv.reader(f, delimiter=';'))
+    header, body = rows[0], rows[1:]
+    changes = max(1, int(len(body) * fraction))
+    for i in rng.sample(range(len(body)), changes):
+        body[i][3] = f"{rng.uniform(100, 20000):.2f}"
+    del body[:changes]
+    body.extend(claim_row(rng, 10 ** 8 + i) for i in range(changes))
+    with open(path, 'w', newline='', encoding='latin-1') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(header)
+        writer.writerows(body)
+
+
+def write_metadata_json(folder: Path):
+    # metadata.json in the layout load_metadata expects, describing every CSV in the folder
+    columns = {name: {"description": description, "type": kind}
+               for name, (description, kind) in CLAIM_COLUMNS.items()}
+    metadata = {
+        file.name: {
+            "file_description": "Sinistres automobile declares et indemnises, une ligne par sinistre",
+            "columns": columns,
+        }
+        for file in sorted(folder.glob('*.csv'))
+    }
+    with open(folder / 'metadata.json', 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+
+LEGAL_SUBJECTS = ["L'assureur", "L'assuré", "Le souscripteur", "L'intermédiaire d'assurance", "Le bénéficiaire"]
+LEGAL_OBLIGATIONS = [
+    "est tenu de déclarer le sinistre",
+    "doit verser l'indemnité due",
+    "peut résilier le contrat",
+    "doit informer le Comité Général des Assurances",
+    "est tenu de communiquer les conditions générales",
+]
+LEGAL_CONDITIONS = [
+    "dans un délai de {days} jours à compter de la survenance du sinistre",
+    "sous peine de déchéance de la garantie",
+    "sauf cas fortuit ou de force majeure",
+    "conformément aux dispositions du présent code",
+    "par lettre recommandée avec accusé de réception",
+]
+
+
+def legal_text(rng: random.Random, articles: int, first_article: int = 1) -> str:
+    # French statute-like text: numbered articles of two to six sentences
+    paragraphs = []
+    for number in range(first_article, first_article + articles):
+        sentences = [
+            f"{rng.choice(LEGAL_SUBJECTS)} {rng.choice(LEGAL_OBLIGATIONS)} "
+            f"{rng.choice(LEGAL_CONDITIONS).format(days=rng.choice([5, 8, 15, 30]))}."
+            for _ in range(rng.randint(2, 6))
+        ]
+        paragraphs.append(f"Article {number}. " + " ".join(sentences))
+    return "\n".join(paragraphs)
+
+
+def write_legal_jsonl(path: Path, documents: int, articles_per_document: int, seed: int = 0):
+    # Documents in the {"file_name", "messages"} layout read by the instruction dataset generator
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for n in range(documents):
+            record = {"file_name": f"code_assurances_{n:03d}.pdf", "messages": legal_text(rng, articles_per_document)}
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
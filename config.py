@@ -4,4 +4,55 @@ import os
 CSV_FOLDER = ""
 CHROMA_DB_PATH = "./"
 CHROMA_COLLECTION_NAME = ""
+VECTOR_BACKEND = "chroma"  # "chroma", or "compact" for int8 vectors in a memory-mapped file next to CHROMA_DB_PATH
+COMPACT_RERANK_CANDIDATES = 100  # Compact backend: int8 hits re-scored against the float32 vectors
+COMPACT_SCAN_ROWS = 1_000_000  # Compact backend: int8 rows converted and scored per step of a query
 OLLAMA_MODEL = "llama3.1"  # Added Ollama model configuration
+SIMILARITY_TOP_K = 2  # Rows retrieved per question
+HYBRID_RETRIEVAL = True  # Fuse BM25 keyword hits with vector hits, pre-filtered by file and dates in the question
+HYBRID_CANDIDATES = 20  # Hits taken from each side before fusion
+RRF_K = 60  # Reciprocal rank fusion constant
+KEYWORD_MAX_DOC_FRACTION = 0.5  # Question words found in more than this share of rows are left out of the BM25 query
+KEYWORD_PIN_RATIO = 2.0  # A keyword hit scoring this many times the next one (an exact id) is ranked first
+STREAM_RESPONSES = True  # Print answers token by token as Ollama generates them
+QUERY_RESULTS_CSV = "query_results.csv"  # Sources, answers and timings of every CLI query
+FAST_START = False  # Open the existing index without syncing the CSV folder (same as --fast-start)
+TIMINGS_PATH = None  # JSON file per-stage timings are written to on exit (same as --timings PATH), None disables them
+
+# Query server (python main.py --serve)
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8000
+OLLAMA_BASE_URL = "http://localhost:11434"
+OLLAMA_CONCURRENCY = 4  # Generations sent to Ollama at the same time
+SERVER_QUEUE_LIMIT = 64  # Queries waiting for a generation slot before new ones get a 503
+QUERY_TIMEOUT = 120.0  # Seconds before a query gets a 504, overridable per request
+
+# Structured (SQL) answers for aggregate, filter and group-by questions
+STRUCTURED_QUERIES = True
+STRUCTURED_DB_PATH = os.path.join(CHROMA_DB_PATH, "claims.sqlite")
+STRUCTURED_QUERY_TIMEOUT = 10.0  # Seconds a model-written SQL query may run before it is interrupted
+
+# Cache of answers to repeated or rephrased questions
+RESPONSE_CACHE = True
+RESPONSE_CACHE_PATH = os.path.join(CHROMA_DB_PATH, "response_cache.json")
+RESPONSE_CACHE_MAX_ENTRIES = 1000
+RESPONSE_CACHE_TTL = 7 * 24 * 3600  # Seconds an answer stays valid
+RESPONSE_CACHE_SIMILARITY = 0.95  # Cosine similarity above which a rephrased question is a hit
+
+# Ingestion settings
+INGEST_BATCH_SIZE = 1000  # Documents parsed, embedded and inserted together
+INGEST_PREFETCH_BATCHES = 2  # Parsed batches buffered ahead of the embedder
+INLINE_SCHEMA = False  # Prepend file and column descriptions to every row text (legacy layout)
+CSV_COLUMNAR = True  # Parse DATE_* columns and render row texts a block at a time
+CSV_WORKERS = 1  # Processes parsing CSV chunks in parallel, 1 parses in the main process
+CSV_CHUNK_BYTES = 32 * 1024 * 1024  # Large files are split into byte ranges of about this size
+CHUNK_ROWS = 1  # Consecutive rows packed into one document as a table, 1 keeps one document per row
+CHUNK_KEY = None  # Column (e.g. "NUM_POLICE") whose value change also ends a document, when CHUNK_ROWS > 1
+
+# Embedding settings
+EMBED_MODEL_NAME = "BAAI/bge-small-en"
+EMBED_BATCH_SIZE = 32  # Texts per forward pass, sorted by length so padding stays small
+EMBED_SORT_WINDOW = 1024  # Texts deduplicated and length-sorted together before batching
+EMBED_NUM_THREADS = None  # torch intra-op threads, None keeps the torch default
+EMBED_INTEROP_THREADS = None  # torch inter-op threads, None keeps the torch default
+EMBED_CACHE = True  # Persist embeddings keyed by model name and text hash next to CHROMA_DB_PATH
@@ -1,87 +1,165 @@
+import argparse
 import os
 import json
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
 from PyPDF2 import PdfReader
 
 def extract_pdf_text(pdf_path):
     try:
         reader = PdfReader(pdf_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-        return text
+        # Pages are extracted one at a time and joined once
+        return "".join(page.extract_text() for page in reader.pages)
     except Exception as e:
         print(f"Erreur lors du traitement du PDF {pdf_path}: {str(e)}")
         return ""
 
+def decode_text(raw, encoding):
+    # Same text as reading the file in text mode, which turns \r\n and \r into \n
+    return raw.decode(encoding).replace('\r\n', '\n').replace('\r', '\n')
+
 def extract_txt_text(txt_path):
-    # Try encodings commonly used for French text files
+    # Try encodings commonly used for French text files, all on one read of the file
     encodings = ['cp1252', 'iso-8859-1', 'utf-8', 'latin-1']
     
+    try:
+        with open(txt_path, 'rb') as file:
+            raw = file.read()
+    except Exception as e:
+        print(f"Erreur de lecture du fichier {txt_path}: {str(e)}")
+        return ""
+    
     for encoding in encodings:
         try:
-            with open(txt_path, 'r', encoding=encoding) as file:
-                content = file.read()
-                # Verify if the content contains common French characters to validate encoding
-                if any(char in content for char in 'éèêëàâäôöûüçîï'):
-                    return content
+            content = decode_text(raw, encoding)
         except UnicodeDecodeError:
             continue
-        except Exception as e:
-            print(f"Erreur de lecture du fichier {txt_path}: {str(e)}")
-            continue
+        # Verify if the content contains common French characters to validate encoding
+        if any(char in content for char in 'éèêëàâäôöûüçîï'):
+            return content
     
     # If no encoding worked with French character validation, try one last time with cp1252
     try:
-        with open(txt_path, 'r', encoding='cp1252') as file:
-            return file.read()
-    except Exception as e:
+        return decode_text(raw, 'cp1252')
+    except UnicodeDecodeError as e:
         print(f"Impossible de décoder le fichier {txt_path}: {str(e)}")
         return ""
 
-def folder_to_jsonl(folder_path, output_jsonl_path):
+def extract_file_text(file_path):
+    try:
+        if file_path.lower().endswith('.pdf'):
+            return extract_pdf_text(file_path)
+        return extract_txt_text(file_path)
+    except Exception as e:
+        print(f"Erreur lors du traitement du fichier {file_path}: {str(e)}")
+        return ""
+
+class ExtractionCache:
+    """Extracted texts in SQLite, valid while the file keeps the same path, size and mtime."""
+
+    def __init__(self, cache_path):
+        self.conn = sqlite3.connect(cache_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS texts (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, text TEXT)")
+
+    def _key(self, file_path):
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+    def __contains__(self, file_path):
+        return self.conn.execute(
+            "SELECT 1 FROM texts WHERE path = ? AND size = ? AND mtime_ns = ?", self._key(file_path)).fetchone() is not None
+
+    def get(self, file_path):
+        row = self.conn.execute(
+            "SELECT text FROM texts WHERE path = ? AND size = ? AND mtime_ns = ?", self._key(file_path)).fetchone()
+        return row[0] if row else None
+
+    def put(self, file_path, text):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO texts VALUES (?, ?, ?, ?)", (*self._key(file_path), text))
+
+    def close(self):
+        self.conn.close()
+
+def map_bounded(pool, fn, items, window):
+    # Like pool.map, in order, but with at most `window` calls submitted and not yet consumed,
+    # so extracted texts of a large folder do not pile up in memory ahead of the writer
+    items = iter(items)
+    pending = deque(pool.submit(fn, item) for item in islice(items, window))
+    while pending:
+        result = pending.popleft().result()
+        for item in islice(items, 1):
+            pending.append(pool.submit(fn, item))
+        yield result
+
+def iter_folder_texts(folder_path, workers=1, cache=None):
+    """Yield (filename, text, cached) for each PDF or text file in the folder, text empty when extraction failed.
+
+    Files missing from the cache are extracted by `workers` processes; results come back in folder order.
+    """
+    filenames = [f for f in os.listdir(folder_path) if f.lower().endswith(('.pdf', '.txt'))]
+    paths = [os.path.join(folder_path, f) for f in filenames]
+    cached = [cache is not None and path in cache for path in paths]
+    stale = [path for path, hit in zip(paths, cached) if not hit]
+    
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(stale) > 1 else nullcontext() as pool:
+        extracted = map_bounded(pool, extract_file_text, stale, 2 * workers) if pool else map(extract_file_text, stale)
+        for filename, path, hit in zip(filenames, paths, cached):
+            if hit:
+                yield filename, cache.get(path), True
+                continue
+            text = next(extracted)
+            # Failures are not cached, so the next run tries them again
+            if cache is not None and text:
+                cache.put(path, text)
+            yield filename, text, False
+
+def folder_to_jsonl(folder_path, output_jsonl_path, workers=1, cache_path=None):
     processed_files = 0
     failed_files = 0
+    cached_files = 0
+    cache = ExtractionCache(cache_path) if cache_path else None
+    started = time.perf_counter()
     
-    # Open the JSONL file in write mode
-    with open(output_jsonl_path, "w", encoding="utf-8") as jsonl_file:
-        # Iterate through all files in the folder
-        for filename in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, filename)
-            
-            try:
-                if filename.lower().endswith('.pdf'):
-                    text = extract_pdf_text(file_path)
-                    file_type = "pdf"
-                elif filename.lower().endswith('.txt'):
-                    text = extract_txt_text(file_path)
-                    file_type = "txt"
-                else:
-                    continue
-                
-                if text:  # Only write to file if text was successfully extracted
-                    # Create a dictionary for this file
-                    file_info = {
-                        "file_name": filename,
-                        "text": text
-                    }
-                    # Write the JSON object as a single line
-                    jsonl_file.write(json.dumps(file_info, ensure_ascii=False) + '\n')
-                    processed_files += 1
-                    print(f"Traitement réussi: {filename}")
-                else:
-                    failed_files += 1
-                    print(f"Échec du traitement: {filename}")
-                    
-            except Exception as e:
+    # One file's text in memory at a time, written through a 1 MiB buffer
+    with open(output_jsonl_path, "w", encoding="utf-8", buffering=1 << 20) as jsonl_file:
+        for filename, text, cached in iter_folder_texts(folder_path, workers, cache):
+            if text:  # Only write to file if text was successfully extracted
+                file_info = {
+                    "file_name": filename,
+                    "text": text
+                }
+                # Write the JSON object as a single line
+                jsonl_file.write(json.dumps(file_info, ensure_ascii=False) + '\n')
+                processed_files += 1
+                cached_files += cached
+                print(f"Traitement réussi: {filename}{' (cache)' if cached else ''}")
+            else:
                 failed_files += 1
-                print(f"Erreur lors du traitement du fichier {filename}: {str(e)}")
-                continue
+                print(f"Échec du traitement: {filename}")
     
+    if cache is not None:
+        cache.close()
+    elapsed = time.perf_counter() - started
+    files = processed_files + failed_files
     print(f"\nFichier JSONL créé: {output_jsonl_path}")
-    print(f"Fichiers traités avec succès: {processed_files}")
+    print(f"Fichiers traités avec succès: {processed_files} (dont {cached_files} depuis le cache)")
     print(f"Fichiers échoués: {failed_files}")
+    print(f"{files} fichiers en {elapsed:.1f} s ({files / max(elapsed, 1e-9):.1f} fichiers/s)")
 
-# Example usage
-folder_path = "---/general knowledge/pdf/to text"
-output_jsonl_path = "training_text.jsonl"  # Changed extension to .jsonl
-folder_to_jsonl(folder_path, output_jsonl_path)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract PDF and text files of a folder into a JSONL file")
+    parser.add_argument("--folder", default="---/general knowledge/pdf/to text")
+    parser.add_argument("--output", default="training_text.jsonl")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="extraction processes")
+    parser.add_argument("--cache", default=None, help="extraction cache, next to --output by default")
+    parser.add_argument("--no-cache", action="store_true", help="extract every file again")
+    args = parser.parse_args()
+    
+    cache_path = None if args.no_cache else args.cache or args.output + ".cache.sqlite"
+    folder_to_jsonl(args.folder, args.output, args.workers, cache_path)
@@ -1,24 +1,78 @@
+import argparse
+import hashlib
 import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from typing import List, Dict, Tuple
+from transformers import AutoModelForCausalLM, AutoTokenizer, DynamicCache
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 import nltk
 from nltk.tokenize import sent_tokenize
 import logging
 import os
+import time
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Enhanced prompt for Tunisian insurance law context
+SYSTEM_PROMPT = """Vous êtes un expert spécialisé en droit et réglementation des assurances en Tunisie. 
+Votre tâche est de générer des questions perspicaces et des réponses détaillées basées sur les sections du texte juridique fourni.
+
+Lignes directrices pour la génération :
+1. Concentrez-vous sur les concepts juridiques clés, les exigences réglementaires et les implications pratiques.
+2. Tenez compte du contexte spécifique du marché tunisien de l'assurance.
+3. Mettez en évidence les définitions légales importantes, les obligations et les exigences de conformité.
+4. Incluez des références pertinentes aux codes et réglementations des assurances en Tunisie lorsque cela est applicable.
+5. Assurez-vous que la réponse offre une compréhension complète tout en restant fidèle au texte source.
+
+Générez votre réponse en français, en maintenant la précision et la clarté juridiques.
+Formatez votre réponse exactement comme suit :
+Question : [Votre question]
+Réponse : [Votre réponse détaillée]
+"""
+
+NUM_BEAMS = 2  # Reduced for CPU efficiency
+
+SECTION_TOKENS = 300  # Section budget in model tokens, about 200 French words, kept small for CPU processing
+
+
+@lru_cache(maxsize=None)
+def ensure_punkt():
+    """Download NLTK's punkt sentence model only when it is not installed yet, once per process."""
+    try:
+        sent_tokenize("Texte.", language='french')
+    except LookupError:
+        # Newer NLTK releases read punkt_tab, older ones punkt
+        for resource in ('punkt_tab', 'punkt'):
+            nltk.download(resource, quiet=True)
+
+
 class InstructionDatasetGenerator:
-    def __init__(self, model_name: str = "Qwen/Qwen2.5-1.5B-Instruct"):
-        """Initialize the generator with the specified model."""
+    def __init__(self, model_name: str = "Qwen/Qwen2.5-1.5B-Instruct", load_model: bool = True, tokenizer=None):
+        """Initialize the generator with the specified model.
+
+        With load_model=False only the tokenizer is loaded (or the one given is used), which
+        is enough for sectioning and section keys, to plan or merge sharded runs.
+        """
         self.model_name = model_name
-        self.setup_model()
+        ensure_punkt()
+        self.tokenizer = tokenizer or self.load_tokenizer()
+        if load_model:
+            self.setup_model()
+
+    def load_tokenizer(self):
+        # Decoder-only models generate after the last prompt token, so batches pad on the left
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name, padding_side='left')
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        return tokenizer
         
     def setup_model(self):
-        """Set up the model and tokenizer with CPU optimization."""
+        """Set up the model with CPU optimization."""
         try:
             # Load in 8-bit to reduce memory usage
             self.model = AutoModelForCausalLM.from_pretrained(
@@ -27,149 +81,365 @@ class InstructionDatasetGenerator:
                 device_map="cpu",
                 load_in_8bit=True
             )
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            nltk.download('punkt')
+            self.setup_prefix_cache()
             logger.info("Model and tokenizer initialized successfully on CPU")
         except Exception as e:
             logger.error(f"Error setting up model: {str(e)}")
             raise
 
-    def read_jsonl(self, file_path: str) -> List[Dict]:
-        """Read the input JSONL file."""
-        data = []
+    def setup_prefix_cache(self):
+        """Run the system prompt through the model once; generate calls start from its key/values."""
+        marker = "<<section>>"
+        prompt = self.build_prompt(marker)
+        self.prefix_ids = self.tokenizer(prompt[:prompt.index(marker)]).input_ids
+        with torch.no_grad():
+            # Kept as per-layer (key, value) tensors, copied into a fresh cache for each batch
+            self.prefix_cache = self.model(
+                torch.tensor([self.prefix_ids]), past_key_values=DynamicCache(), use_cache=True
+            ).past_key_values.to_legacy_cache()
+        logger.info(f"Cached the {len(self.prefix_ids)}-token prompt prefix")
+
+    def read_jsonl(self, file_path: str) -> Iterator[Dict]:
+        """Yield the documents of the input JSONL file one at a time."""
+        count = 0
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 for line in f:
-                    data.append(json.loads(line.strip()))
-            logger.info(f"Successfully read {len(data)} documents from {file_path}")
-            return data
+                    if line.strip():
+                        count += 1
+                        yield json.loads(line)
+            logger.info(f"Successfully read {count} documents from {file_path}")
         except Exception as e:
             logger.error(f"Error reading JSONL file: {str(e)}")
             raise
 
-    def split_into_coherent_sections(self, text: str) -> List[str]:
-        """Split text into coherent sections using sentence tokenization and grouping."""
+    def split_into_coherent_sections(self, text: str, max_tokens: int = SECTION_TOKENS) -> List[str]:
+        """Split text into sections of whole sentences of at most max_tokens model tokens.
+
+        Sentences are tokenized together in one call and packed in a single pass; a
+        sentence longer than the budget becomes a section of its own.
+        """
         try:
             sentences = sent_tokenize(text, language='french')
+            if not sentences:
+                return []
+            lengths = [len(ids) for ids in self.tokenizer(sentences, add_special_tokens=False).input_ids]
             
-            # Smaller sections for CPU processing (200 words instead of 300)
             sections = []
-            current_section = []
-            current_length = 0
-            
-            for sentence in sentences:
-                sentence_length = len(sentence.split())
-                if current_length + sentence_length > 200 and current_section:
-                    sections.append(' '.join(current_section))
-                    current_section = [sentence]
-                    current_length = sentence_length
-                else:
-                    current_section.append(sentence)
-                    current_length += sentence_length
-            
-            if current_section:
-                sections.append(' '.join(current_section))
-                
+            start, current_length = 0, 0
+            for i, sentence_length in enumerate(lengths):
+                if current_length + sentence_length > max_tokens and i > start:
+                    sections.append(' '.join(sentences[start:i]))
+                    start, current_length = i, 0
+                current_length += sentence_length
+            sections.append(' '.join(sentences[start:]))
             return sections
         except Exception as e:
             logger.error(f"Error splitting text into sections: {str(e)}")
             raise
 
+    def iter_sections(self, documents: Iterable[Dict]) -> Iterator[Tuple[str, str, str]]:
+        """Yield (file_name, section, section_key) for each section, one document in memory at a time."""
+        for doc in documents:
+            for section in self.split_into_coherent_sections(doc['messages']):
+                yield doc['file_name'], section, self.section_key(doc['file_name'], section)
+
+    def build_prompt(self, section: str) -> str:
+        """Render the chat prompt for one section."""
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": section}
+        ]
+        return self.tokenizer.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=True
+        )
+
+    def parse_qa_pair(self, response: str) -> Tuple[str, str]:
+        """Split a generated response into its question and answer."""
+        try:
+            question = response.split("Question:")[1].split("Answer:")[0].strip()
+            answer = response.split("Answer:")[1].strip()
+        except IndexError:
+            logger.warning(f"Could not parse QA pair from response: {response}")
+            question = "ERROR: Could not generate question"
+            answer = "ERROR: Could not generate answer"
+        return question, answer
+
     def generate_qa_pair(self, section: str) -> Tuple[str, str]:
         """Generate a question-answer pair from a given section."""
-        try:
-            # Enhanced prompt for Tunisian insurance law context
-            messages = [
-                {"role": "system", "content": """Vous êtes un expert spécialisé en droit et réglementation des assurances en Tunisie. 
-Votre tâche est de générer des questions perspicaces et des réponses détaillées basées sur les sections du texte juridique fourni.
+        return self.generate_qa_pairs([section], batch_size=1)[0]
 
-Lignes directrices pour la génération :
-1. Concentrez-vous sur les concepts juridiques clés, les exigences réglementaires et les implications pratiques.
-2. Tenez compte du contexte spécifique du marché tunisien de l'assurance.
-3. Mettez en évidence les définitions légales importantes, les obligations et les exigences de conformité.
-4. Incluez des références pertinentes aux codes et réglementations des assurances en Tunisie lorsque cela est applicable.
-5. Assurez-vous que la réponse offre une compréhension complète tout en restant fidèle au texte source.
+    def model_inputs(self, input_ids: List[List[int]], reuse_prefix: bool = True,
+                     num_beams: int = NUM_BEAMS) -> Dict:
+        """Pad a batch of tokenized prompts for generate.
 
-Générez votre réponse en français, en maintenant la précision et la clarté juridiques.
-Formatez votre réponse exactement comme suit :
-Question : [Votre question]
-Réponse : [Votre réponse détaillée]
-"""},
-                {"role": "user", "content": section}
-            ]
-            
-            text = self.tokenizer.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=True
-            )
-            
-            # Optimize generation parameters for CPU
-            model_inputs = self.tokenizer([text], return_tensors="pt")
-            generated_ids = self.model.generate(
-                **model_inputs,
-                max_new_tokens=512,
-                temperature=0.7,
-                do_sample=True,
-                pad_token_id=self.tokenizer.pad_token_id,
-                num_beams=2  # Reduced for CPU efficiency
-            )
-            
-            response = self.tokenizer.batch_decode(
-                [output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)],
-                skip_special_tokens=True
-            )[0]
-            
+        With reuse_prefix, prompts keep the cached system prompt at the front and are padded
+        between it and the section, so generate only runs the section tokens through the model.
+        Positions follow the attention mask, so every prompt sees the same positions as when
+        padded on the left.
+        """
+        if not reuse_prefix or any(ids[:len(self.prefix_ids)] != self.prefix_ids for ids in input_ids):
+            # Left padding keeps every prompt flush against its generated tokens
+            return dict(self.tokenizer.pad({"input_ids": input_ids}, return_tensors="pt"))
+        prefix = len(self.prefix_ids)
+        width = max(len(ids) for ids in input_ids)
+        pad = self.tokenizer.pad_token_id
+        # generate repeats each prompt num_beams times, one cache row per beam
+        rows = len(input_ids) * num_beams
+        cache = DynamicCache.from_legacy_cache(tuple(
+            (key.repeat_interleave(rows, dim=0), value.repeat_interleave(rows, dim=0))
+            for key, value in self.prefix_cache))
+        return {
+            "input_ids": torch.tensor([self.prefix_ids + [pad] * (width - len(ids)) + ids[prefix:] for ids in input_ids]),
+            "attention_mask": torch.tensor([[1] * prefix + [0] * (width - len(ids)) + [1] * (len(ids) - prefix)
+                                            for ids in input_ids]),
+            "past_key_values": cache,
+        }
+
+    def generate_qa_pairs(self, sections: List[str], batch_size: int = 8,
+                          reuse_prefix: bool = True) -> List[Tuple[str, str]]:
+        """Generate question-answer pairs for many sections, batch_size sections per generate call.
+
+        Sections are sorted by prompt length so each batch pads to a similar length,
+        and the pairs are returned in the order of `sections`. With reuse_prefix the
+        system prompt is not run through the model again (see model_inputs).
+        """
+        prompts = [self.build_prompt(section) for section in sections]
+        input_ids = self.tokenizer(prompts).input_ids
+        order = sorted(range(len(prompts)), key=lambda i: len(input_ids[i]))
+        pairs = [None] * len(prompts)
+
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
             try:
-                question = response.split("Question:")[1].split("Answer:")[0].strip()
-                answer = response.split("Answer:")[1].strip()
-            except IndexError:
-                logger.warning(f"Could not parse QA pair from response: {response}")
-                question = "ERROR: Could not generate question"
-                answer = "ERROR: Could not generate answer"
-            
-            return question, answer
-        except Exception as e:
-            logger.error(f"Error generating QA pair: {str(e)}")
-            return "ERROR", str(e)
+                model_inputs = self.model_inputs([input_ids[i] for i in batch], reuse_prefix)
+                generated_ids = self.model.generate(
+                    **model_inputs,
+                    max_new_tokens=512,
+                    temperature=0.7,
+                    do_sample=True,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    num_beams=NUM_BEAMS
+                )
+                responses = self.tokenizer.batch_decode(
+                    generated_ids[:, model_inputs['input_ids'].shape[1]:],
+                    skip_special_tokens=True
+                )
+                for i, response in zip(batch, responses):
+                    pairs[i] = self.parse_qa_pair(response)
+            except Exception as e:
+                logger.error(f"Error generating QA pairs: {str(e)}")
+                for i in batch:
+                    pairs[i] = ("ERROR", str(e))
+        return pairs
+
+    def section_key(self, file_name: str, section: str) -> str:
+        """Stable identifier of the work for one section: same source, prompt and model, same key."""
+        payload = json.dumps([file_name, section, SYSTEM_PROMPT, self.model_name], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def load_checkpoint(self, output_file: str) -> Set[str]:
+        """Return the section keys already in output_file, dropping a partly written last line."""
+        done = set()
+        if not os.path.exists(output_file):
+            return done
+        with open(output_file, 'rb+') as f:
+            complete = 0
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                complete += len(line)
+                try:
+                    record = json.loads(line)
+                    # Failed pairs written by earlier versions are generated again
+                    if not record['instruction'].startswith("ERROR"):
+                        done.add(record['section_key'])
+                except (ValueError, KeyError):
+                    pass
+            # A run killed mid-write leaves a truncated record behind
+            f.truncate(complete)
+        return done
 
-    def process_documents(self, input_file: str, output_file: str, batch_size: int = 5):
-        """Process documents in small batches to manage memory."""
+    def process_documents(self, input_file: str, output_file: str, batch_size: int = 5,
+                          generation_batch_size: int = 8, resume: bool = True,
+                          shard: Optional[Tuple[int, int]] = None):
+        """Process documents in small batches to manage memory.
+
+        The sections of each batch of documents are generated together,
+        generation_batch_size sections per generate call. Results are appended to
+        output_file as each batch finishes; with resume, sections already in the
+        file are skipped, so a restarted run only generates what is missing.
+        With shard=(index, count), only the sections whose key falls in that shard are generated.
+        """
         try:
-            documents = self.read_jsonl(input_file)
+            done = self.load_checkpoint(output_file) if resume else set()
+            if done:
+                logger.info(f"Resuming: {len(done)} sections already in {output_file}")
+            started = time.perf_counter()
+            generated = 0
             
-            with open(output_file, 'w', encoding='utf-8') as f:
-                for i in range(0, len(documents), batch_size):
-                    batch = documents[i:i + batch_size]
-                    logger.info(f"Processing batch {i//batch_size + 1}/{len(documents)//batch_size + 1}")
+            with open(output_file, 'a' if resume else 'w', encoding='utf-8') as f:
+                # Documents are read and sectioned batch by batch, never the whole corpus at once
+                for number, batch in enumerate(batched(self.read_jsonl(input_file), batch_size), 1):
+                    logger.info(f"Processing batch {number}: {', '.join(doc['file_name'] for doc in batch)}")
                     
-                    for doc in batch:
-                        logger.info(f"Processing document: {doc['file_name']}")
-                        sections = self.split_into_coherent_sections(doc['messages'])
-                        
-                        for section in sections:
-                            question, answer = self.generate_qa_pair(section)
-                            
-                            instruction_example = {
-                                "instruction": question,
-                                "input": "",
-                                "output": answer,
-                                "source_document": doc['file_name']
-                            }
-                            
-                            f.write(json.dumps(instruction_example, ensure_ascii=False) + '\n')
-                        
-                        # Clear some memory
-                        torch.cuda.empty_cache() if torch.cuda.is_available() else None
+                    sections = []
+                    for file_name, section, key in self.iter_sections(batch):
+                        if shard is not None and shard_of(key, shard[1]) != shard[0]:
+                            continue
+                        if key not in done:
+                            done.add(key)
+                            sections.append((file_name, section, key))
+                    if not sections:
+                        continue
+                    
+                    pairs = self.generate_qa_pairs([section for _, section, _ in sections], generation_batch_size)
+                    lines = []
+                    for (file_name, _, key), (question, answer) in zip(sections, pairs):
+                        if question.startswith("ERROR"):
+                            # Generation or parsing failed: not written and not done, so it is retried
+                            done.discard(key)
+                            continue
+                        instruction_example = {
+                            "instruction": question,
+                            "input": "",
+                            "output": answer,
+                            "source_document": file_name,
+                            "section_key": key
+                        }
+                        lines.append(json.dumps(instruction_example, ensure_ascii=False) + '\n')
+                    
+                    # One write per batch, flushed to disk before the next batch starts
+                    f.write(''.join(lines))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    
+                    generated += len(sections)
+                    elapsed = time.perf_counter() - started
+                    logger.info(f"{generated} sections in {elapsed:.0f} s ({60 * generated / elapsed:.1f} sections/min)")
+                    
+                    # Clear some memory
+                    torch.cuda.empty_cache() if torch.cuda.is_available() else None
                         
             logger.info(f"Successfully generated instruction dataset: {output_file}")
         except Exception as e:
             logger.error(f"Error processing documents: {str(e)}")
             raise
 
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    """Yield lists of up to size consecutive items, pulling them from items lazily."""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def shard_of(section_key: str, num_shards: int) -> int:
+    """Shard a section belongs to; depends only on its key, so every process agrees."""
+    return int(section_key[:16], 16) % num_shards
+
+
+def shard_path(shard_dir: str, shard: int, num_shards: int) -> str:
+    return os.path.join(shard_dir, f"shard-{shard:05d}-of-{num_shards:05d}.jsonl")
+
+
+def _run_shard(model_name: str, input_file: str, shard_dir: str, shard: int, num_shards: int,
+               threads: int, resume: bool) -> str:
+    # Runs in a fresh worker process with its own model copy and thread budget
+    torch.set_num_threads(threads)
+    generator = InstructionDatasetGenerator(model_name)
+    output_file = shard_path(shard_dir, shard, num_shards)
+    generator.process_documents(input_file, output_file, resume=resume, shard=(shard, num_shards))
+    open(output_file + '.done', 'w').close()
+    return output_file
+
+
+def run_sharded(input_file: str, shard_dir: str, workers: int, threads_per_worker: int,
+                node_rank: int = 0, num_nodes: int = 1, resume: bool = True,
+                model_name: str = "Qwen/Qwen2.5-1.5B-Instruct") -> List[str]:
+    """Generate this node's shards, one worker process per shard.
+
+    Sections are split into workers * num_nodes shards by key; node node_rank runs shards
+    node_rank * workers up to (node_rank + 1) * workers - 1.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    num_shards = workers * num_nodes
+    shards = range(node_rank * workers, (node_rank + 1) * workers)
+    # This node's shards are not done again until their workers finish
+    for shard in shards:
+        if os.path.exists(shard_path(shard_dir, shard, num_shards) + '.done'):
+            os.remove(shard_path(shard_dir, shard, num_shards) + '.done')
+    # Forking a process that has loaded torch is unsafe, workers start from a clean interpreter
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(_run_shard, model_name, input_file, shard_dir, shard, num_shards,
+                               threads_per_worker, resume) for shard in shards]
+        return [future.result() for future in futures]
+
+
+def shards_complete(shard_dir: str, num_shards: int) -> bool:
+    return all(os.path.exists(shard_path(shard_dir, shard, num_shards) + '.done') for shard in range(num_shards))
+
+
+def merge_shards(input_file: str, shard_dir: str, num_shards: int, output_file: str,
+                 model_name: str = "Qwen/Qwen2.5-1.5B-Instruct", node_rank: int = 0):
+    """Merge shard outputs into one JSONL in document and section order, as a serial run writes it."""
+    records = {}
+    for shard in range(num_shards):
+        path = shard_path(shard_dir, shard, num_shards)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.endswith('\n'):
+                    records[json.loads(line)['section_key']] = line
+
+    planner = InstructionDatasetGenerator(model_name, load_model=False)
+    # One temporary file per node: two nodes merging at once each replace the output with a whole file
+    tmp_file = f"{output_file}.{node_rank}.tmp"
+    emitted = set()
+    merged = 0
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        for _, _, key in planner.iter_sections(planner.read_jsonl(input_file)):
+            line = records.get(key)
+            # A section repeated in the input was generated once, write it once
+            if line is not None and key not in emitted:
+                f.write(line)
+                emitted.add(key)
+                merged += 1
+    os.replace(tmp_file, output_file)
+    logger.info(f"Merged {merged} pairs from {num_shards} shards into {output_file}")
+
 if __name__ == "__main__":
-    generator = InstructionDatasetGenerator()
-    generator.process_documents(
-        input_file='trainingtext__.jsonl',
-        output_file='instruction_qwen.jsonl'
-    )
+    parser = argparse.ArgumentParser(description="Generate an instruction dataset from legal texts")
+    parser.add_argument("--input", default='trainingtext__.jsonl', help="JSONL of documents")
+    parser.add_argument("--output", default='instruction_qwen.jsonl', help="JSONL the pairs are appended to")
+    parser.add_argument("--restart", action="store_true", help="overwrite the output instead of resuming")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes on this node, one model each")
+    parser.add_argument("--threads", type=int, default=None, help="torch threads per worker")
+    parser.add_argument("--node-rank", type=int, default=int(os.getenv("NODE_RANK", 0)))
+    parser.add_argument("--num-nodes", type=int, default=int(os.getenv("WORLD_SIZE", 1)))
+    parser.add_argument("--shard-dir", default=None, help="per-shard outputs, next to --output by default")
+    args = parser.parse_args()
+
+    if args.workers == 1 and args.num_nodes == 1:
+        generator = InstructionDatasetGenerator()
+        generator.process_documents(
+            input_file=args.input,
+            output_file=args.output,
+            resume=not args.restart
+        )
+    else:
+        shard_dir = args.shard_dir or args.output + '.shards'
+        threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+        num_shards = args.workers * args.num_nodes
+        run_sharded(args.input, shard_dir, args.workers, threads, args.node_rank, args.num_nodes,
+                    resume=not args.restart)
+        # Whichever node finishes last merges; concurrent merges write the same content
+        if shards_complete(shard_dir, num_shards):
+            merge_shards(args.input, shard_dir, num_shards, args.output, node_rank=args.node_rank)
+        else:
+            logger.info("Other shards still running, leaving the merge to the last node to finish")
@@ -13,7 +13,9 @@ def create_instruction_dataset_job(
     experiment_name: str = "tunisian-insurance-qa-generation",
     compute_name: str = "maxcalculatorcpu",
     input_data_path: str = "data/trainingtext__.jsonl",
-    vm_size: str = "Standard_D4_v3"  # Added VM size parameter with a default
+    vm_size: str = "Standard_D4_v3",  # Added VM size parameter with a default
+    instance_count: int = 1,
+    workers_per_instance: int = 1
 ) -> Optional[any]:
     try:
         # Connect to Azure ML workspace
@@ -38,7 +40,7 @@ def create_instruction_dataset_job(
                 name=compute_name,
                 size=vm_size,
                 min_instances=0,
-                max_instances=1,
+                max_instances=instance_count,
                 idle_time_before_scale_down=120
             )
             ml_client.compute.begin_create_or_update(compute_config).result()
@@ -79,7 +81,11 @@ def create_instruction_dataset_job(
         # Define the command job
         job = command(
             code="./src",
-            command="python instruction_dataset_generator.py",
+            # The output folder is mounted read-write so a preempted run resumes from the pairs
+            # already written; each instance generates its shards and the last one merges them
+            command="python instruction_dataset_generator.py --input ${{inputs.input_data}} "
+                    "--output ${{outputs.instruction_dataset}}/instruction_qwen.jsonl "
+                    f"--workers {workers_per_instance}",
             environment=custom_env,
             compute=compute_name,
             display_name=experiment_name,
@@ -89,12 +95,14 @@ def create_instruction_dataset_job(
             },
             outputs={
                 "instruction_dataset": Output(
-                    type="uri_file",
-                    path="azureml://datastores/workspaceblobstore/paths/outputs/instruction_qwen.jsonl",
-                    mode="upload"
+                    type="uri_folder",
+                    path="azureml://datastores/workspaceblobstore/paths/outputs/instruction_qwen/",
+                    mode="rw_mount"
                 )
             },
-            instance_count=1
+            instance_count=instance_count,
+            # One launcher per instance; it sets NODE_RANK and WORLD_SIZE for the shard split
+            distribution={"type": "pytorch", "process_count_per_instance": 1}
         )
 
         # Submit the job
@@ -129,6 +137,8 @@ if __name__ == "__main__":
     
     # Choose a larger VM size if needed
     selected_vm_size = VM_SIZES['medium']  # Adjust as needed
+    instance_count = int(os.getenv("INSTANCE_COUNT", 1))
+    workers_per_instance = int(os.getenv("WORKERS_PER_INSTANCE", 1))  # Each loads its own model copy
     
     print("Submitting Azure ML job...")
     job = create_instruction_dataset_job(
@@ -136,7 +146,9 @@ if __name__ == "__main__":
         subscription_id=subscription_id,
         resource_group=resource_group,
         compute_name=compute_name,
-        vm_size=selected_vm_size
+        vm_size=selected_vm_size,
+        instance_count=instance_count,
+        workers_per_instance=workers_per_instance
     )
     
     if job is None:
@@ -1,14 +1,76 @@
-import os
-from src.vector_store import setup_vector_store
-from src.query_engine import setup_query_engine, query_to_csv
-from config import CSV_FOLDER
+import argparse
+import atexit
+import time
+from config import (CSV_FOLDER, CHROMA_DB_PATH, CHROMA_COLLECTION_NAME, STRUCTURED_QUERIES, RESPONSE_CACHE,
+                    HYBRID_RETRIEVAL, FAST_START, TIMINGS_PATH)
 
 def main():
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Query automobile insurance claims in plain language")
+    parser.add_argument("--serve", action="store_true", help="serve queries over HTTP instead of the prompt")
+    parser.add_argument("--fast-start", action="store_true", default=FAST_START,
+                        help="open the existing index without syncing the CSV folder")
+    parser.add_argument("--timings", metavar="PATH", default=TIMINGS_PATH,
+                        help="write per-stage timings (CSV parse, embedding, retrieval...) to this JSON file on exit")
+    args = parser.parse_args()
+
+    if args.timings:
+        from src.timing import enable_timings
+        atexit.register(enable_timings().save, args.timings)
+
+    # llama_index and chromadb are only imported once the arguments are known
+    from src.vector_store import (setup_vector_store, open_vector_store, index_fingerprint, index_name,
+                                  load_manifest)
+    from src.embeddings import build_embed_model, BackgroundEmbedding
+    from src.keyword_index import KeywordIndex, keyword_index_path
+    from src.document_processor import load_metadata
+    from src.structured_store import setup_structured_store
+    from src.response_cache import ResponseCache, CachedQueryEngine
+    from src.query_engine import setup_query_engine, query_to_csv, build_text_qa_template, build_retriever
+
+    keyword_index = None
+    if HYBRID_RETRIEVAL:
+        keyword_index = KeywordIndex(keyword_index_path(CHROMA_DB_PATH, index_name(CHROMA_COLLECTION_NAME)))
+
     # Set up the vector store
-    index = setup_vector_store(CSV_FOLDER)
+    index = None
+    manifest = None
+    synced = False
+    if args.fast_start:
+        # The embedding model loads in the background while the existing index is opened
+        embed_model = BackgroundEmbedding(build_embed_model)
+        manifest = load_manifest()
+        index = open_vector_store(embed_model=embed_model, keyword_index=keyword_index, manifest=manifest)
+        if index is None:
+            print("No existing index to open, syncing the CSV folder")
+    else:
+        embed_model = build_embed_model()
+    if index is None:
+        index = setup_vector_store(CSV_FOLDER, embed_model=embed_model, keyword_index=keyword_index)
+        # The sync rewrote the manifest, the fingerprint reads it again
+        manifest = None
+        synced = True
+
+    if args.serve:
+        from src.server import run_server
+        run_server(build_retriever(index, keyword_index), build_text_qa_template(load_metadata(CSV_FOLDER)))
+        return
+
+    # Load the typed copy of the CSVs used for aggregate questions
+    metadata = load_metadata(CSV_FOLDER)
+    structured_store = None
+    if STRUCTURED_QUERIES:
+        # Fast start trusts the copy made by the last full start, like the vector index
+        structured_store = setup_structured_store(CSV_FOLDER, metadata, sync=synced)
 
     # Set up the query engine
-    query_engine = setup_query_engine(index)
+    query_engine = setup_query_engine(index, metadata, structured_store=structured_store,
+                                      keyword_index=keyword_index)
+    if RESPONSE_CACHE:
+        cache = ResponseCache(embed_model, index_fingerprint(CSV_FOLDER, manifest=manifest))
+        query_engine = CachedQueryEngine(query_engine, cache)
+
+    print(f"Ready in {time.perf_counter() - started:.1f} s")
 
     # Interactive query loop
     while True:
@@ -0,0 +1,273 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Any, List, Optional, Sequence
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import BasePydanticVectorStore, VectorStoreQuery, VectorStoreQueryResult
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+from config import COMPACT_RERANK_CANDIDATES, COMPACT_SCAN_ROWS
+
+WHERE_OPERATORS = {'$eq': '=', '$ne': '!=', '$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+
+
+def compact_store_path(db_path: str, collection_name: str) -> str:
+    return os.path.join(db_path, f"{collection_name or 'default'}_compact")
+
+
+def quantize(vectors: np.ndarray):
+    # Symmetric per-row int8 codes; row i is approximately codes[i] * scales[i]
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def is_filter_key(key: str) -> bool:
+    # Metadata keys the pre-filters use, kept in the indexed row_values table
+    return key == 'file_name' or key.endswith(('_from', '_to'))
+
+
+def where_sql(where: dict):
+    """Translates a Chroma `where` filter into a SELECT of the matching slots.
+
+    File names and date bounds are looked up in the row_values index; any other key is
+    read from the metadata JSON of every row.
+    """
+    if len(where) != 1:
+        return where_sql({'$and': [{key: value} for key, value in where.items()]})
+    key, value = next(iter(where.items()))
+    if key in ('$and', '$or'):
+        parts = [where_sql(clause) for clause in value]
+        combine = " INTERSECT " if key == '$and' else " UNION "
+        sql = combine.join(f"SELECT slot FROM ({part})" for part, _ in parts)
+        return sql, [param for _, params in parts for param in params]
+    if is_filter_key(key):
+        select, params = "SELECT slot FROM row_values WHERE key = ? AND value", [key]
+    else:
+        select = "SELECT slot FROM rows WHERE json_extract(metadata, ?)"
+        params = ['$."' + key.replace('"', '\\"') + '"']
+    if not isinstance(value, dict):
+        value = {'$eq': value}
+    (operator, operand), = value.items()
+    if operator in ('$in', '$nin'):
+        placeholders = ','.join('?' * len(operand))
+        return f"{select} {'NOT ' if operator == '$nin' else ''}IN ({placeholders})", [*params, *operand]
+    if operator not in WHERE_OPERATORS:
+        raise ValueError(f"Unsupported where operator {operator}")
+    return f"{select} {WHERE_OPERATORS[operator]} ?", [*params, operand]
+
+
+class CompactVectorStore(BasePydanticVectorStore):
+    """Vector store keeping int8 codes in a memory-mapped file, with an exact re-rank.
+
+    Queries scan the int8 codes (a quarter of the float32 size) chunk by chunk, then
+    re-score the best `rerank_candidates` against float32 vectors read from disk.
+    Row text and metadata live in SQLite; Chroma-style `where` filters are accepted
+    through `vector_store_kwargs`. The float32 vectors stay on disk next to the codes,
+    so the store is not smaller than Chroma on disk: what it saves is the memory a
+    query scans.
+    """
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+    path: str
+    rerank_candidates: int = COMPACT_RERANK_CANDIDATES
+    scan_rows: int = COMPACT_SCAN_ROWS
+
+    _conn: sqlite3.Connection = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+    _dim: Optional[int] = PrivateAttr(default=None)
+    _size: int = PrivateAttr(default=0)
+    _live: np.ndarray = PrivateAttr()
+    _free: List[int] = PrivateAttr()
+    _mapped: Optional[tuple] = PrivateAttr(default=None)
+
+    def __init__(self, path: str, **kwargs: Any):
+        super().__init__(path=path, **kwargs)
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(path, "rows.sqlite"), check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS rows (
+                slot INTEGER PRIMARY KEY, node_id TEXT UNIQUE, ref_doc_id TEXT, text TEXT, metadata TEXT);
+            CREATE INDEX IF NOT EXISTS rows_ref_doc_id ON rows (ref_doc_id);
+            CREATE TABLE IF NOT EXISTS row_values (
+                key TEXT, value, slot INTEGER, PRIMARY KEY (key, value, slot)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS row_values_slot ON row_values (slot);
+        """)
+        with self._conn:
+            if self._conn.execute("SELECT 1 FROM info WHERE key = 'row_values'").fetchone() is None:
+                # Stores written before row_values existed are indexed once from their metadata
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO row_values SELECT json_each.key, json_each.value, rows.slot "
+                    "FROM rows, json_each(rows.metadata) WHERE json_each.key = 'file_name' "
+                    "OR json_each.key LIKE '%\\_from' ESCAPE '\\' OR json_each.key LIKE '%\\_to' ESCAPE '\\'")
+                self._conn.execute("INSERT INTO info VALUES ('row_values', '1')")
+        self._load()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CompactVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return self._conn
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        row = self._conn.execute("SELECT value FROM info WHERE key = 'dim'").fetchone()
+        self._dim = int(row[0]) if row else None
+        self._size = os.path.getsize(self._file("scales.f32")) // 4 if self._dim else 0
+        self._live = np.zeros(self._size, dtype=bool)
+        slots = [slot for (slot,) in self._conn.execute("SELECT slot FROM rows")]
+        self._live[slots] = True
+        self._free = sorted(np.flatnonzero(~self._live).tolist(), reverse=True)
+        self._mapped = None
+
+    def _maps(self, mode: str = 'r'):
+        # (codes, scales, vectors) memory maps over the current number of slots
+        if mode != 'r' or self._mapped is None:
+            shape = (self._size, self._dim)
+            maps = (np.memmap(self._file("codes.i8"), dtype=np.int8, mode=mode, shape=shape),
+                    np.memmap(self._file("scales.f32"), dtype=np.float32, mode=mode, shape=(self._size,)),
+                    np.memmap(self._file("vectors.f32"), dtype=np.float32, mode=mode, shape=shape))
+            if mode != 'r':
+                return maps
+            self._mapped = maps
+        return self._mapped
+
+    def _grow(self, size: int):
+        for name, row_bytes in (("codes.i8", self._dim), ("scales.f32", 4), ("vectors.f32", 4 * self._dim)):
+            with open(self._file(name), 'ab') as f:
+                f.truncate(size * row_bytes)
+        self._live = np.concatenate([self._live, np.zeros(size - self._size, dtype=bool)])
+        self._size = size
+
+    def count(self) -> int:
+        return int(self._live.sum())
+
+    def memory_bytes(self) -> int:
+        # Bytes scanned per query: int8 codes, scales and the live mask
+        return self._size * ((self._dim or 0) + 4 + 1)
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        codes, scales = quantize(vectors)
+
+        with self._lock, self._conn:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self._conn.execute("INSERT INTO info VALUES ('dim', ?)", (str(self._dim),))
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Expected {self._dim}-dimensional embeddings, got {vectors.shape[1]}")
+            self._remove(self._conn.execute(
+                f"SELECT slot FROM rows WHERE node_id IN ({','.join('?' * len(nodes))})",
+                [node.node_id for node in nodes]).fetchall())
+
+            slots = [self._free.pop() if self._free else None for _ in nodes]
+            appended = sum(slot is None for slot in slots)
+            first = self._size
+            if appended:
+                self._grow(self._size + appended)
+            new_slots = iter(range(first, self._size))
+            slots = [slot if slot is not None else next(new_slots) for slot in slots]
+
+            codes_map, scales_map, vectors_map = self._maps('r+')
+            codes_map[slots] = codes
+            scales_map[slots] = scales
+            vectors_map[slots] = vectors
+            for mapped in (codes_map, scales_map, vectors_map):
+                mapped.flush()
+            self._mapped = None
+            self._live[slots] = True
+
+            self._conn.executemany("INSERT INTO rows VALUES (?, ?, ?, ?, ?)", [
+                (slot, node.node_id, node.ref_doc_id, node.get_content(),
+                 json.dumps(node_to_metadata_dict(node, remove_text=True, flat_metadata=False)))
+                for slot, node in zip(slots, nodes)
+            ])
+            self._conn.executemany("INSERT OR IGNORE INTO row_values VALUES (?, ?, ?)", [
+                (key, value, slot) for slot, node in zip(slots, nodes)
+                for key, value in node.metadata.items() if is_filter_key(key)
+            ])
+        return [node.node_id for node in nodes]
+
+    def _remove(self, rows):
+        slots = [slot for (slot,) in rows]
+        if slots:
+            self._conn.executemany("DELETE FROM rows WHERE slot = ?", [(slot,) for slot in slots])
+            self._conn.executemany("DELETE FROM row_values WHERE slot = ?", [(slot,) for slot in slots])
+            self._live[slots] = False
+            self._free.extend(slots)
+            self._free.sort(reverse=True)
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self.delete_many([ref_doc_id])
+
+    def delete_many(self, ref_doc_ids: List[str]):
+        with self._lock, self._conn:
+            for start in range(0, len(ref_doc_ids), 500):
+                chunk = ref_doc_ids[start:start + 500]
+                self._remove(self._conn.execute(
+                    f"SELECT slot FROM rows WHERE ref_doc_id IN ({','.join('?' * len(chunk))})", chunk).fetchall())
+
+    def clear(self):
+        with self._lock:
+            self._conn.close()
+            shutil.rmtree(self.path)
+        self.__init__(self.path, rerank_candidates=self.rerank_candidates, scan_rows=self.scan_rows)
+
+    def query(self, query: VectorStoreQuery, where: Optional[dict] = None, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise ValueError("CompactVectorStore takes Chroma-style `where` filters, not MetadataFilters")
+        with self._lock:
+            if not self._size:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+            mask = self._live
+            if where:
+                sql, params = where_sql(where)
+                allowed = [slot for (slot,) in self._conn.execute(sql, params)]
+                mask = np.zeros(self._size, dtype=bool)
+                mask[allowed] = True
+            codes, scales, vectors = self._maps()
+
+        q = np.asarray(query.query_embedding, dtype=np.float32)
+        q /= np.linalg.norm(q) + 1e-12
+        scores = np.full(self._size, -np.inf, dtype=np.float32)
+        for start in range(0, self._size, self.scan_rows):
+            end = min(start + self.scan_rows, self._size)
+            approx = (codes[start:end].astype(np.float32) @ q) * scales[start:end]
+            scores[start:end] = np.where(mask[start:end], approx, -np.inf)
+
+        live = int(mask.sum())
+        top_k = min(query.similarity_top_k, live)
+        candidates = min(max(self.rerank_candidates, top_k), live)
+        if top_k == 0:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+        shortlist = np.sort(np.argpartition(-scores, candidates - 1)[:candidates])
+        exact = np.asarray(vectors[shortlist]) @ q
+        order = np.argsort(-exact)[:top_k]
+        slots = [int(slot) for slot in shortlist[order]]
+
+        with self._lock:
+            rows = {slot: (text, metadata) for slot, text, metadata in self._conn.execute(
+                f"SELECT slot, text, metadata FROM rows WHERE slot IN ({','.join('?' * len(slots))})", slots)}
+        nodes, similarities, ids = [], [], []
+        for slot, similarity in zip(slots, exact[order]):
+            text, metadata = rows[slot]
+            node = metadata_dict_to_node(json.loads(metadata), text=text)
+            nodes.append(node)
+            similarities.append(float(similarity))
+            ids.append(node.node_id)
+        return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=ids)
@@ -1,43 +1,418 @@
 import csv
+import io
+import multiprocessing
+import os
+import queue
+import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import groupby, islice
+from operator import itemgetter
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
 from llama_index.core import Document
 from llama_index.core.readers.base import BaseReader
 
+DEFAULT_BATCH_SIZE = 1000
+COLUMNAR_BLOCK_SIZE = 4096
+DATE_CACHE_SIZE = 1 << 16
+DEFAULT_CHUNK_BYTES = 32 << 20
+ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+def _parse_date(cell: str) -> str:
+    try:
+        if ':' in cell:  # For DATE_EXECUTION format
+            date_obj = datetime.strptime(cell, '%d%b%y:%H:%M:%S')
+            return date_obj.strftime('%Y-%m-%d %H:%M:%S')
+        else:  # For other date formats
+            date_obj = datetime.strptime(cell, '%d/%m/%Y')
+            return date_obj.strftime('%Y-%m-%d')
+    except ValueError:
+        return cell
+
+
+# Claim exports repeat the same few thousand dates across millions of cells
+normalize_date = lru_cache(maxsize=DATE_CACHE_SIZE)(_parse_date)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def date_key(cell: str) -> Optional[int]:
+    # Dates as YYYYMMDD integers, the form stored in row metadata for range filters
+    value = normalize_date(cell)
+    if ISO_DATE.match(value):
+        return int(value[:4] + value[5:7] + value[8:10])
+    return None
+
+
+def date_metadata(dates: Dict[str, int]) -> Dict[str, int]:
+    metadata = {}
+    for column, key in dates.items():
+        metadata[f"{column}_from"] = key
+        metadata[f"{column}_to"] = key
+    return metadata
+
+
+def _row_text(headers: List[str], row: List[str], parse_date=_parse_date) -> str:
+    content = {}
+    for j, cell in enumerate(row):
+        if j < len(headers):
+            header = headers[j]
+            if header.startswith("DATE_"):
+                cell = parse_date(cell)
+            content[header] = cell
+    return ", ".join(f"{k}: {v}" for k, v in content.items())
+
+
+def _block_texts(headers: List[str], rows: List[List[str]]) -> List[str]:
+    width = len(headers)
+    if width == 0:
+        return [""] * len(rows)
+    if len(set(headers)) != width:
+        # Repeated headers collapse into one dict key per row, keep the row-wise rendering
+        return [_row_text(headers, row, normalize_date) for row in rows]
+
+    texts = [None] * len(rows)
+    full = []
+    for k, row in enumerate(rows):
+        if len(row) >= width:
+            full.append(k)
+        else:
+            texts[k] = _row_text(headers, row, normalize_date)
+    if full:
+        columns = list(zip(*(rows[k][:width] for k in full)))
+        for j, header in enumerate(headers):
+            if header.startswith("DATE_"):
+                columns[j] = map(normalize_date, columns[j])
+        template = ", ".join(
+            header.replace('{', '{{').replace('}', '}}') + ": {}" for header in headers
+        )
+        for k, values in zip(full, zip(*columns)):
+            texts[k] = template.format(*values)
+    return texts
+
+
+def _table_texts(headers: List[str], rows: List[List[str]], parse_date=_parse_date) -> List[str]:
+    # Cells only, in header order; the header line is written once per grouped document
+    dates = {j for j, header in enumerate(headers) if header.startswith("DATE_")}
+    width = len(headers)
+    return [" | ".join(parse_date(cell) if j in dates else cell for j, cell in enumerate(row[:width]))
+            for row in rows]
+
+
+def read_headers(file: Path) -> Optional[List[str]]:
+    with open(file, 'r', newline='', encoding='latin-1') as f:
+        return next(csv.reader(f, delimiter=';'), None)
+
+
+def iter_row_blocks(file: Path, block_size: int = COLUMNAR_BLOCK_SIZE) -> Iterator[Tuple[List[str], List[List[str]]]]:
+    with open(file, 'r', newline='', encoding='latin-1') as f:
+        reader = csv.reader(f, delimiter=';')
+        headers = next(reader, None)
+        while True:
+            rows = list(islice(reader, block_size))
+            if not rows:
+                break
+            yield headers, rows
+
+
+class RowError(Exception):
+    pass
+
+
+def _render_rows(headers: List[str], rows: List[List[str]], columnar: bool, tabular: bool = False,
+                 key_column: Optional[str] = None) -> list:
+    # Returns (text, {DATE_* column: YYYYMMDD}, key cell) per row, or a RowError in place of
+    # a row that could not be rendered
+    texts = None
+    if tabular:
+        texts = _table_texts(headers, rows, normalize_date if columnar else _parse_date)
+    elif columnar:
+        try:
+            texts = _block_texts(headers, rows)
+        except Exception:
+            pass
+    if texts is None:
+        parse_date = normalize_date if columnar else _parse_date
+        texts = []
+        for row in rows:
+            try:
+                texts.append(_row_text(headers, row, parse_date))
+            except Exception as e:
+                texts.append(RowError(str(e)))
+
+    date_columns = [(j, header) for j, header in enumerate(headers or []) if header.startswith("DATE_")]
+    key_index = headers.index(key_column) if key_column and key_column in (headers or []) else None
+    results = []
+    for text, row in zip(texts, rows):
+        if isinstance(text, RowError):
+            results.append(text)
+            continue
+        dates = {}
+        for j, header in date_columns:
+            if j < len(row):
+                key = date_key(row[j])
+                if key is not None:
+                    dates[header] = key
+        key = row[key_index] if key_index is not None and key_index < len(row) else None
+        results.append((text, dates, key))
+    return results
+
+
+def _file_chunks(file: Path, chunk_bytes: int):
+    # Splits the body of a CSV after its header into byte ranges ending on record boundaries:
+    # a newline after an even number of quotes, so quoted fields spanning lines stay whole
+    with open(file, 'rb') as f:
+        header_line = f.readline()
+        headers = next(csv.reader([header_line.decode('latin-1')], delimiter=';'), None)
+        size = os.fstat(f.fileno()).st_size
+        chunks = []
+        start = len(header_line)
+        quotes = 0
+        while start < size:
+            target = start + chunk_bytes
+            if target >= size:
+                chunks.append((start, size))
+                break
+            # Quotes are counted over every byte once, at C speed
+            quotes += f.read(target - f.tell()).count(b'"')
+            end = size
+            position, block = target, f.read(1 << 16)
+            while block:
+                offset = 0
+                newline = block.find(b'\n')
+                while newline != -1:
+                    quotes += block.count(b'"', offset, newline + 1)
+                    offset = newline + 1
+                    if quotes % 2 == 0:
+                        break
+                    newline = block.find(b'\n', offset)
+                if newline != -1:
+                    end = position + offset
+                    break
+                quotes += block.count(b'"', offset)
+                position += len(block)
+                block = f.read(1 << 16)
+            f.seek(end)
+            chunks.append((start, end))
+            start = end
+    return headers, chunks
+
+
+def _parse_chunk(task):
+    file, start, end, headers, columnar, tabular, key_column = task
+    with open(file, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start).decode('latin-1')
+    rows = list(csv.reader(io.StringIO(data, newline=''), delimiter=';'))
+    return _render_rows(headers, rows, columnar, tabular, key_column)
+
+
 class ImprovedCSVReader(BaseReader):
+    """Reads claim CSVs into one Document per row, or per group of rows.
+
+    With `chunk_rows` > 1, up to that many consecutive rows are packed into one Document
+    rendered as a table; with `chunk_key` as well, a group also ends where the value of
+    that column changes, so rows of one policy or claim stay together.
+    """
+
+    def __init__(self, columnar: bool = False, block_size: int = COLUMNAR_BLOCK_SIZE,
+                 workers: int = 1, chunk_bytes: int = DEFAULT_CHUNK_BYTES, chunk_rows: int = 1,
+                 chunk_key: Optional[str] = None):
+        self.columnar = columnar
+        self.block_size = block_size
+        self.workers = workers
+        self.chunk_bytes = chunk_bytes
+        self.chunk_rows = chunk_rows
+        self.chunk_key = chunk_key if chunk_rows > 1 else None
+        self._pool = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def iter_documents(self, file: Path) -> Iterator[Document]:
+        if self.workers > 1:
+            for _, document in self.iter_files([file]):
+                yield document
+            return
+        yield from self._documents(file, read_headers(file), self._iter_rows(file))
+
+    def _iter_rows(self, file: Path):
+        start = 2
+        for headers, rows in iter_row_blocks(file, self.block_size):
+            yield from _rows(file, start, _render_rows(headers, rows, self.columnar, self.chunk_rows > 1,
+                                                      self.chunk_key))
+            start += len(rows)
+
+    def _documents(self, file: Path, headers: List[str], rows) -> Iterator[Document]:
+        if self.chunk_rows <= 1:
+            for row, text, dates, _ in rows:
+                yield _row_document(file, row, text, dates)
+            return
+        group = []
+        for record in rows:
+            if group and (len(group) == self.chunk_rows or record[3] != group[-1][3]):
+                yield _group_document(file, headers, group, self.chunk_key)
+                group = []
+            group.append(record)
+        if group:
+            yield _group_document(file, headers, group, self.chunk_key)
+
+    def iter_files(self, files: Iterable[Path]) -> Iterator[Tuple[Path, Document]]:
+        # Chunks of every file are parsed across the process pool and yielded back in file
+        # and row order, so row numbers and error messages match a serial run
+        if self._pool is None:
+            # Created from the prefetch thread after torch is loaded, where forking is unsafe
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        headers = {}
+        for file, group in groupby(self._iter_parsed_rows(files, headers), key=itemgetter(0)):
+            for document in self._documents(file, headers[file], (record for _, record in group)):
+                yield file, document
+
+    def _iter_parsed_rows(self, files: Iterable[Path], headers: Dict[Path, List[str]]):
+        pending = deque()
+        next_row = {}
+
+        def drain():
+            file, future = pending.popleft()
+            results = future.result()
+            start = next_row.get(file, 2)
+            next_row[file] = start + len(results)
+            for record in _rows(file, start, results):
+                yield file, record
+
+        for file in files:
+            headers[file], chunks = _file_chunks(file, self.chunk_bytes)
+            for start, end in chunks:
+                task = (file, start, end, headers[file], self.columnar, self.chunk_rows > 1, self.chunk_key)
+                pending.append((file, self._pool.submit(_parse_chunk, task)))
+                if len(pending) > 2 * self.workers:
+                    yield from drain()
+        while pending:
+            yield from drain()
+
+    def iter_batches(self, file: Path, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[Document]]:
+        return _batched(self.iter_documents(file), batch_size)
+
     def load_data(self, file: Path) -> List[Document]:
-        documents = []
-        with open(file, 'r', newline='', encoding='latin-1') as f:
-            reader = csv.reader(f, delimiter=';') 
-            headers = next(reader, None)
-            for i, row in enumerate(reader, start=2):
-                try:
-                    content = {}
-                    for j, cell in enumerate(row):
-                        if j < len(headers):
-                            header = headers[j]
-                            if header.startswith("DATE_"):
-                                try:
-                                    if ':' in cell:  # For DATE_EXECUTION format
-                                        date_obj = datetime.strptime(cell, '%d%b%y:%H:%M:%S')
-                                        cell = date_obj.strftime('%Y-%m-%d %H:%M:%S')
-                                    else:  # For other date formats
-                                        date_obj = datetime.strptime(cell, '%d/%m/%Y')
-                                        cell = date_obj.strftime('%Y-%m-%d')
-                                except ValueError:
-                                    pass
-                            content[header] = cell
-
-                    content_str = ", ".join(f"{k}: {v}" for k, v in content.items())
-                    documents.append(Document(text=content_str))
-                except Exception as e:
-                    print(f"Error processing row {i} in {file}: {e}")
-        return documents
-
-def load_csv_directory(directory: str) -> List[Document]:
-    reader = ImprovedCSVReader()
+        return list(self.iter_documents(file))
+
+
+def _rows(file: Path, start: int, results: list) -> Iterator[tuple]:
+    # (row number, text, dates, key cell) for every row that rendered
+    for i, result in enumerate(results, start=start):
+        if isinstance(result, Exception):
+            print(f"Error processing row {i} in {file}: {result}")
+            continue
+        yield (i, *result)
+
+
+def _metadata_document(text: str, metadata: dict) -> Document:
+    return Document(
+        text=text,
+        metadata=metadata,
+        excluded_embed_metadata_keys=list(metadata),
+        excluded_llm_metadata_keys=[key for key in metadata if key != 'file_name'],
+    )
+
+
+def _row_document(file: Path, row: int, text: str, dates: Dict[str, int]) -> Document:
+    return _metadata_document(text, {'file_name': file.name, 'row': row, **date_metadata(dates)})
+
+
+def _group_document(file: Path, headers: List[str], group: list, chunk_key: Optional[str]) -> Document:
+    # Date metadata spans the group: earliest _from and latest _to of each DATE_* column
+    date_ranges = {}
+    for _, _, dates, _ in group:
+        for column, key in dates.items():
+            low, high = date_ranges.get(column, (key, key))
+            date_ranges[column] = (min(low, key), max(high, key))
+    metadata = {'file_name': file.name, 'row': group[0][0], 'last_row': group[-1][0], 'row_count': len(group)}
+    if chunk_key and group[0][3] is not None:
+        metadata[chunk_key] = group[0][3]
+    for column, (low, high) in date_ranges.items():
+        metadata[f"{column}_from"] = low
+        metadata[f"{column}_to"] = high
+    text = " | ".join(headers or []) + "\n" + "\n".join(text for _, text, _, _ in group)
+    return _metadata_document(text, metadata)
+
+
+def _batched(iterable: Iterable, batch_size: int) -> Iterator[list]:
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_csv_directory(directory: str, batch_size: int = DEFAULT_BATCH_SIZE, columnar: bool = False,
+                       workers: int = 1, chunk_rows: int = 1, chunk_key: Optional[str] = None) -> Iterator[List[Document]]:
+    with ImprovedCSVReader(columnar=columnar, workers=workers, chunk_rows=chunk_rows, chunk_key=chunk_key) as reader:
+        files = sorted(Path(directory).glob('*.csv'))
+        if workers > 1:
+            for _, group in groupby(reader.iter_files(files), key=itemgetter(0)):
+                yield from _batched((document for _, document in group), batch_size)
+        else:
+            for file in files:
+                yield from reader.iter_batches(file, batch_size)
+
+
+def load_csv_directory(directory: str, columnar: bool = False, workers: int = 1) -> List[Document]:
     documents = []
-    for file in Path(directory).glob('*.csv'):
-        documents.extend(reader.load_data(file))
+    for batch in iter_csv_directory(directory, columnar=columnar, workers=workers):
+        documents.extend(batch)
     return documents
+
+
+def prefetch(iterable: Iterable, depth: int = 2) -> Iterator:
+    # Produces items on a background thread, holding at most `depth` of them in memory
+    items = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(done)
+        except BaseException as e:
+            put(e)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
@@ -10,17 +10,36 @@ def load_metadata(csv_folder):
             return json.load(f)
     return {}
 
-def enhance_documents_with_metadata(documents: List[Document], metadata):
+def describe_columns(file_metadata):
+    columns_info = ""
+    for col, info in file_metadata.get('columns', {}).items():
+        columns_info += f"{col}: {info['description']} ({info['type']})\n"
+    return columns_info
+
+def describe_schema(metadata, file_names=None):
+    # One block per file, meant to be placed once in the prompt rather than in every row
+    blocks = []
+    for file_name, file_metadata in metadata.items():
+        if file_names is not None and file_name not in file_names:
+            continue
+        blocks.append(f"File: {file_name}\n"
+                      f"File Description: {file_metadata.get('file_description', '')}\n"
+                      f"Columns Information:\n{describe_columns(file_metadata)}")
+    return "\n".join(blocks)
+
+def enhance_documents_with_metadata(documents: List[Document], metadata, inline_schema=False):
+    if not inline_schema:
+        # Rows are embedded as-is; the schema is looked up by file_name at query time
+        return documents
+
     enhanced_documents = []
     for doc in documents:
-        file_name = "AA.csv"
+        file_name = doc.metadata.get('file_name')
         if file_name in metadata:
             file_metadata = metadata[file_name]
             doc.metadata['file_description'] = file_metadata.get('file_description', '')
             
-            columns_info = ""
-            for col, info in file_metadata.get('columns', {}).items():
-                columns_info += f"{col}: {info['description']} ({info['type']})\n"
+            columns_info = describe_columns(file_metadata)
             doc.metadata['columns_info'] = columns_info
             
             doc.text = f"File Description: {file_metadata.get('file_description', '')}\n\n" \
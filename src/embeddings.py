@@ -0,0 +1,205 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, List, Optional
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from config import (CHROMA_DB_PATH, EMBED_MODEL_NAME, EMBED_BATCH_SIZE, EMBED_SORT_WINDOW,
+                    EMBED_NUM_THREADS, EMBED_INTEROP_THREADS, EMBED_CACHE)
+
+
+def configure_torch_threads(num_threads: Optional[int] = None, interop_threads: Optional[int] = None):
+    import torch
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Can only be set once, before any inter-op parallel work has started
+            print("Embedding inter-op thread count already fixed for this process")
+
+
+class EmbeddingCache:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        unique = list(set(keys))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, blob in self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk):
+                    found[key] = array('f', blob).tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                ((key, array('f', vector).tobytes()) for key, vector in items.items()),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embeds through an inner model in length-sorted batches, caching vectors on disk.
+
+    llama_index hands over up to `embed_batch_size` texts at a time; those are deduplicated,
+    looked up in the cache, and the misses are sorted by length and embedded `batch_size` at a
+    time so rows of similar length are padded together.
+    """
+
+    batch_size: int = 32
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _cache: Optional[EmbeddingCache] = PrivateAttr()
+    _embedded: int = PrivateAttr(default=0)
+    _cache_hits: int = PrivateAttr(default=0)
+    _seconds: float = PrivateAttr(default=0.0)
+
+    def __init__(self, inner: BaseEmbedding, cache: Optional[EmbeddingCache] = None, **kwargs: Any):
+        super().__init__(model_name=inner.model_name, **kwargs)
+        self._inner = inner
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def embeddings_per_second(self) -> float:
+        return self._embedded / self._seconds if self._seconds else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'embedded': self._embedded,
+            'cache_hits': self._cache_hits,
+            'seconds': self._seconds,
+            'embeddings_per_second': self.embeddings_per_second,
+        }
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._inner._get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await self._inner._aget_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys = [EmbeddingCache.key(self.model_name, text) for text in texts]
+        vectors = self._cache.get_many(keys) if self._cache else {}
+        self._cache_hits += sum(1 for key in keys if key in vectors)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        if missing:
+            pending = sorted(missing.items(), key=lambda item: len(item[1]))
+            computed = {}
+            start_time = time.perf_counter()
+            for start in range(0, len(pending), self.batch_size):
+                bucket = pending[start:start + self.batch_size]
+                embeddings = self._inner._get_text_embeddings([text for _, text in bucket])
+                computed.update(zip((key for key, _ in bucket), embeddings))
+            self._seconds += time.perf_counter() - start_time
+            self._embedded += len(computed)
+            if self._cache:
+                self._cache.put_many(computed)
+            vectors.update(computed)
+
+        return [vectors[key] for key in keys]
+
+
+def embedding_cache_path(db_path: str = CHROMA_DB_PATH) -> str:
+    return os.path.join(db_path, "embedding_cache.sqlite")
+
+
+def build_embed_model(db_path: str = CHROMA_DB_PATH) -> CachedEmbedding:
+    # Imported here: pulls in torch and transformers, which dominate start-up time
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    configure_torch_threads(EMBED_NUM_THREADS, EMBED_INTEROP_THREADS)
+    inner = HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME, embed_batch_size=EMBED_BATCH_SIZE)
+    cache = EmbeddingCache(embedding_cache_path(db_path)) if EMBED_CACHE else None
+    return CachedEmbedding(inner, cache=cache, batch_size=EMBED_BATCH_SIZE,
+                           embed_batch_size=EMBED_SORT_WINDOW)
+
+
+class BackgroundEmbedding(BaseEmbedding):
+    """Loads and warms up an embedding model in a background thread.
+
+    Calls block until the model is ready, so the index and the prompt can be set up while
+    torch and the model weights are still loading.
+    """
+
+    _thread: threading.Thread = PrivateAttr()
+    _model: Optional[BaseEmbedding] = PrivateAttr(default=None)
+    _error: Optional[BaseException] = PrivateAttr(default=None)
+
+    def __init__(self, factory: Callable[[], BaseEmbedding], **kwargs: Any):
+        kwargs.setdefault('model_name', EMBED_MODEL_NAME)
+        kwargs.setdefault('embed_batch_size', EMBED_SORT_WINDOW)
+        super().__init__(**kwargs)
+        self._thread = threading.Thread(target=self._load, args=(factory,), daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BackgroundEmbedding"
+
+    def _load(self, factory):
+        try:
+            model = factory()
+            # The first forward pass is much slower than the next ones, get it out of the way
+            model.get_query_embedding("warm up")
+            self._model = model
+        except BaseException as e:
+            self._error = e
+
+    @property
+    def model(self) -> BaseEmbedding:
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError(f"Embedding model failed to load: {self._error}") from self._error
+        return self._model
+
+    @property
+    def embeddings_per_second(self) -> float:
+        return getattr(self.model, 'embeddings_per_second', 0.0)
+
+    def stats(self) -> Dict[str, float]:
+        return self.model.stats()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self.model._get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await self.model._aget_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self.model._get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.model._get_text_embeddings(texts)
@@ -0,0 +1,160 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import List, Optional, Tuple
+from config import KEYWORD_MAX_DOC_FRACTION
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def _fold(token: str) -> str:
+    # The form the FTS tokenizer stores: lower case, diacritics removed
+    return ''.join(c for c in unicodedata.normalize('NFD', token) if not unicodedata.combining(c)).lower()
+
+
+def keyword_index_path(db_path: str, collection_name: str) -> str:
+    return os.path.join(db_path, f"{collection_name or 'default'}_keywords.sqlite")
+
+
+class RowFilters:
+    """Pre-filters shared by the keyword index and the Chroma query.
+
+    `date_range` is an inclusive (from, to) pair of YYYYMMDD integers; a row matches when
+    any of `date_columns` overlaps it.
+    """
+
+    def __init__(self, file_names: Optional[List[str]] = None, date_range: Optional[Tuple[int, int]] = None,
+                 date_columns: Optional[List[str]] = None):
+        self.file_names = file_names or []
+        self.date_range = date_range
+        self.date_columns = date_columns or []
+
+    def __bool__(self):
+        return bool(self.file_names or (self.date_range and self.date_columns))
+
+    def __repr__(self):
+        return f"RowFilters(file_names={self.file_names}, date_range={self.date_range}, " \
+               f"date_columns={self.date_columns})"
+
+    def to_chroma_where(self) -> dict:
+        clauses = []
+        if self.file_names:
+            clauses.append({'file_name': {'$in': self.file_names}})
+        if self.date_range and self.date_columns:
+            low, high = self.date_range
+            overlaps = [{'$and': [{f"{column}_from": {'$lte': high}}, {f"{column}_to": {'$gte': low}}]}
+                        for column in self.date_columns]
+            clauses.append(overlaps[0] if len(overlaps) == 1 else {'$or': overlaps})
+        if not clauses:
+            return {}
+        return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+class KeywordIndex:
+    """SQLite FTS5 (BM25) index over the same row documents as the vector store."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.created = not os.path.exists(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS rows (
+                id INTEGER PRIMARY KEY, doc_id TEXT UNIQUE, file_name TEXT, text TEXT, metadata TEXT);
+            CREATE INDEX IF NOT EXISTS rows_file_name ON rows (file_name);
+            CREATE TABLE IF NOT EXISTS row_dates (
+                id INTEGER, column_name TEXT, date_from INTEGER, date_to INTEGER);
+            CREATE INDEX IF NOT EXISTS row_dates_range ON row_dates (column_name, date_from, date_to);
+            CREATE INDEX IF NOT EXISTS row_dates_id ON row_dates (id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS rows_fts USING fts5(
+                text, content='rows', content_rowid='id', tokenize='unicode61 remove_diacritics 2');
+            CREATE VIRTUAL TABLE IF NOT EXISTS rows_vocab USING fts5vocab(rows_fts, 'row');
+            CREATE TRIGGER IF NOT EXISTS rows_insert AFTER INSERT ON rows BEGIN
+                INSERT INTO rows_fts (rowid, text) VALUES (new.id, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS rows_delete AFTER DELETE ON rows BEGIN
+                INSERT INTO rows_fts (rows_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                DELETE FROM row_dates WHERE id = old.id;
+            END;
+        """)
+        self._row_count = None
+
+    def add(self, documents):
+        with self._lock, self._conn:
+            self._row_count = None
+            for doc in documents:
+                self._conn.execute("DELETE FROM rows WHERE doc_id = ?", (doc.id_,))
+                cursor = self._conn.execute(
+                    "INSERT INTO rows (doc_id, file_name, text, metadata) VALUES (?, ?, ?, ?)",
+                    (doc.id_, doc.metadata.get('file_name'), doc.text, json.dumps(doc.metadata)))
+                self._conn.executemany(
+                    "INSERT INTO row_dates VALUES (?, ?, ?, ?)",
+                    [(cursor.lastrowid, key[:-len('_from')], value, doc.metadata.get(key[:-len('_from')] + '_to'))
+                     for key, value in doc.metadata.items() if key.endswith('_from')])
+
+    def delete(self, doc_ids):
+        doc_ids = list(doc_ids)
+        with self._lock, self._conn:
+            self._row_count = None
+            for start in range(0, len(doc_ids), 500):
+                chunk = doc_ids[start:start + 500]
+                self._conn.execute(f"DELETE FROM rows WHERE doc_id IN ({','.join('?' * len(chunk))})", chunk)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._row_count = None
+            self._conn.execute("DELETE FROM rows")
+
+    def date_columns(self) -> List[str]:
+        with self._lock:
+            return [column for (column,) in self._conn.execute("SELECT DISTINCT column_name FROM row_dates")]
+
+    def file_names(self) -> List[str]:
+        with self._lock:
+            return [name for (name,) in self._conn.execute("SELECT DISTINCT file_name FROM rows")]
+
+    def search(self, query_str: str, top_k: int, filters: Optional[RowFilters] = None) -> List[Tuple[str, str, dict, float]]:
+        # Returns (doc_id, text, metadata, score) with higher scores for better BM25 matches
+        tokens = {_fold(token) for token in TOKEN_PATTERN.findall(query_str)}
+        if not tokens:
+            return []
+        with self._lock:
+            tokens = self._selective(tokens)
+        if not tokens:
+            return []
+        match = " OR ".join('"' + token.replace('"', '""') + '"' for token in sorted(tokens))
+        sql = ("SELECT rows.doc_id, rows.text, rows.metadata, bm25(rows_fts) AS rank "
+               "FROM rows_fts JOIN rows ON rows.id = rows_fts.rowid WHERE rows_fts MATCH ?")
+        params = [match]
+        if filters and filters.file_names:
+            sql += f" AND rows.file_name IN ({','.join('?' * len(filters.file_names))})"
+            params.extend(filters.file_names)
+        if filters and filters.date_range and filters.date_columns:
+            sql += (" AND EXISTS (SELECT 1 FROM row_dates WHERE row_dates.id = rows.id AND column_name IN "
+                    f"({','.join('?' * len(filters.date_columns))}) AND date_from <= ? AND date_to >= ?)")
+            params.extend(filters.date_columns)
+            params.extend([filters.date_range[1], filters.date_range[0]])
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(top_k)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [(doc_id, text, json.loads(metadata), -rank) for doc_id, text, metadata, rank in rows]
+
+    def _selective(self, tokens):
+        # Words in most rows ("sinistre" is in every NUM_SINISTRE) carry no BM25 weight but
+        # OR-match every row, pushing rows matched by nothing else into the candidates
+        if self._row_count is None:
+            self._row_count = self._conn.execute("SELECT count(*) FROM rows").fetchone()[0]
+        placeholders = ','.join('?' * len(tokens))
+        frequencies = dict(self._conn.execute(
+            f"SELECT term, doc FROM rows_vocab WHERE term IN ({placeholders})", sorted(tokens)))
+        limit = KEYWORD_MAX_DOC_FRACTION * self._row_count
+        return {token for token in tokens if frequencies.get(token, 0) <= limit}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import sqlite3
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+MANIFEST_VERSION = 3
+
+
+def manifest_path(db_path: str, collection_name: str) -> str:
+    return os.path.join(db_path, f"{collection_name or 'default'}_manifest.sqlite")
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def hash_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def row_ids(file_name: str, texts: Iterable[str], seen: Counter = None) -> List[str]:
+    # Identical rows inside one file get an occurrence suffix so each keeps its own vector.
+    # Pass the same `seen` counter for every batch of a file when ids are assigned in batches.
+    seen = Counter() if seen is None else seen
+    ids = []
+    for text in texts:
+        digest = hash_text(text)[:32]
+        ids.append(f"{file_name}:{digest}:{seen[digest]}")
+        seen[digest] += 1
+    return ids
+
+
+class IndexManifest:
+    """Per-file sizes, hashes and row ids in SQLite, one row per CSV file.
+
+    File entries are small and kept in memory; the row ids of a file are only read when
+    that file is re-synced, and each update writes just its own file's row.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = None
+        self.metadata_hash = None
+        self.files: Dict[str, dict] = {}
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # The file is created by the first write only, so loading a missing manifest leaves none behind
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS files (
+                    name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT, rows TEXT);
+            """)
+        return self._conn
+
+    @classmethod
+    def load(cls, path: str) -> "IndexManifest":
+        manifest = cls(path)
+        if not os.path.exists(path):
+            return manifest
+        conn = manifest._connection()
+        info = dict(conn.execute("SELECT key, value FROM info"))
+        if info.get('version') == str(MANIFEST_VERSION):
+            manifest.version = MANIFEST_VERSION
+            manifest.metadata_hash = info.get('metadata_hash')
+            manifest.files = {name: {'size': size, 'mtime_ns': mtime_ns, 'sha256': sha256}
+                              for name, size, mtime_ns, sha256 in conn.execute(
+                                  "SELECT name, size, mtime_ns, sha256 FROM files")}
+        else:
+            # Another layout, or no entry was ever committed: nothing in it can be matched to vectors
+            with conn:
+                conn.execute("DELETE FROM info")
+                conn.execute("DELETE FROM files")
+        return manifest
+
+    def exists(self) -> bool:
+        # True once an entry has been committed with this layout's version
+        return self.version == MANIFEST_VERSION
+
+    def is_unchanged(self, file: Path, stat: os.stat_result) -> bool:
+        entry = self.files.get(file.name)
+        return bool(entry) and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+
+    def rows(self, file_name: str) -> List[str]:
+        if self._conn is None:
+            return []
+        row = self._conn.execute("SELECT rows FROM files WHERE name = ?", (file_name,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def update(self, file: Path, stat: os.stat_result, sha256: str, rows: Optional[List[str]] = None):
+        # rows=None keeps the stored row ids, for a file that was touched but not changed
+        self.files[file.name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+        conn = self._connection()
+        with conn:
+            if rows is None:
+                conn.execute("UPDATE files SET size = ?, mtime_ns = ?, sha256 = ? WHERE name = ?",
+                             (stat.st_size, stat.st_mtime_ns, sha256, file.name))
+            else:
+                conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                             (file.name, stat.st_size, stat.st_mtime_ns, sha256, json.dumps(rows)))
+            # Committed with the first entry, so an interrupted first sync is resumed, not rebuilt
+            conn.execute("INSERT OR IGNORE INTO info VALUES ('version', ?)", (str(MANIFEST_VERSION),))
+        self.version = MANIFEST_VERSION
+
+    def remove(self, file_name: str):
+        self.files.pop(file_name, None)
+        if self._conn is not None:
+            with self._conn:
+                self._conn.execute("DELETE FROM files WHERE name = ?", (file_name,))
+
+    def clear(self):
+        self.files = {}
+        if self._conn is not None:
+            with self._conn:
+                self._conn.execute("DELETE FROM files")
+
+    def fingerprint(self) -> str:
+        state = {name: entry['sha256'] for name, entry in sorted(self.files.items())}
+        return hash_text(json.dumps([self.metadata_hash, state]))
+
+    def save(self):
+        # File entries are written as they change; this records the layout they were built with
+        conn = self._connection()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO info VALUES (?, ?)", [
+                ('version', str(MANIFEST_VERSION)), ('metadata_hash', self.metadata_hash)])
+        self.version = MANIFEST_VERSION
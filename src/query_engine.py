@@ -1,22 +1,181 @@
+import csv
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from llama_index.core import PromptTemplate
+from llama_index.core.callbacks import CallbackManager, CBEventType
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.llms.ollama import Ollama
+from src.document_processor import describe_schema
+from src.retrieval import HybridRetriever
+from src.structured_store import StructuredQueryEngine, ClaimsQueryRouter
+from src.timing import record
+from config import INLINE_SCHEMA, STREAM_RESPONSES, QUERY_RESULTS_CSV, SIMILARITY_TOP_K
 
-def setup_query_engine(index):
-    llm = Ollama(model="llama3.1", request_timeout=420.0)
-    
+FILE_NAME_LINE = re.compile(r'^file_name: (.+)$', re.MULTILINE)
+
+CSV_FIELDS = [
+    "timestamp", "query", "kind", "file_name", "score", "text",
+    "retrieval_s", "prompt_build_s", "first_token_s", "generation_s", "total_s",
+]
+
+
+class RetrievalTimer(BaseCallbackHandler):
+    """Records when the last retrieval of a query started and finished."""
+
+    def __init__(self):
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+        self.reset()
+
+    def reset(self):
+        self.started = None
+        self.finished = None
+
+    def on_event_start(self, event_type, payload=None, event_id="", parent_id="", **kwargs):
+        if event_type == CBEventType.RETRIEVE:
+            self.started = time.perf_counter()
+        return event_id
+
+    def on_event_end(self, event_type, payload=None, event_id="", **kwargs):
+        if event_type == CBEventType.RETRIEVE:
+            self.finished = time.perf_counter()
+
+    def start_trace(self, trace_id=None):
+        pass
+
+    def end_trace(self, trace_id=None, trace_map=None):
+        pass
+
+
+retrieval_timer = RetrievalTimer()
+
+def build_text_qa_template(metadata=None, inline_schema=INLINE_SCHEMA):
     custom_prompt = (
         "You are an AI assistant specialized in analyzing automobile insurance claims data. "
         "Use the following metadata and column information to provide accurate and detailed responses:\n"
         "{metadata_and_columns}\n\n"
+        "Claims data rows:\n"
+        "{context_str}\n\n"
         "Human: {query_str}\n"
         "AI: "
     )
+    if inline_schema:
+        return PromptTemplate(custom_prompt).partial_format(metadata_and_columns="")
+    metadata = metadata or {}
+
+    def schema_of_context(context_str="", **kwargs):
+        # Once per prompt, and only for the files whose rows are in it: each retrieved row
+        # carries a "file_name: ..." line in the context, other files' schemas are left out
+        return describe_schema(metadata, set(FILE_NAME_LINE.findall(context_str)))
+
+    return PromptTemplate(custom_prompt, function_mappings={'metadata_and_columns': schema_of_context})
+
+def build_retriever(index, keyword_index=None, callback_manager=None):
+    if keyword_index is None:
+        retriever = index.as_retriever(similarity_top_k=SIMILARITY_TOP_K)
+        # as_retriever always passes the index's own callback manager
+        if callback_manager is not None:
+            retriever.callback_manager = callback_manager
+        return retriever
+    return HybridRetriever(index, keyword_index, callback_manager=callback_manager)
+
+def setup_query_engine(index, metadata=None, inline_schema=INLINE_SCHEMA, structured_store=None,
+                       streaming=STREAM_RESPONSES, keyword_index=None, llm=None):
+    llm = llm or Ollama(model="llama3.1", request_timeout=420.0)
+    text_qa_template = build_text_qa_template(metadata, inline_schema)
+    callback_manager = CallbackManager([retrieval_timer])
     
-    query_engine = index.as_query_engine(
+    query_engine = RetrieverQueryEngine.from_args(
+        build_retriever(index, keyword_index, callback_manager),
         llm=llm,
-        text_qa_template=custom_prompt,
+        text_qa_template=text_qa_template,
+        streaming=streaming,
+        callback_manager=callback_manager,
     )
+    if structured_store is not None:
+        structured_engine = StructuredQueryEngine(structured_store, llm, metadata)
+        query_engine = ClaimsQueryRouter(query_engine, structured_engine)
     return query_engine
 
-def see_response(query_engine, query_str):
+def stream_response(query_engine, query_str, on_token=None, on_response=None):
+    # Runs one query, passing the response to on_response as soon as query() returns and
+    # answer tokens to on_token as they arrive. Returns the response, its full text and
+    # the per-stage timings in seconds.
+    retrieval_timer.reset()
+    start = time.perf_counter()
     response = query_engine.query(query_str)
-    print(response)
+    returned = time.perf_counter()
+    if on_response:
+        on_response(response)
+
+    first_token = None
+    if getattr(response, 'response_gen', None) is not None:
+        tokens = []
+        for token in response.response_gen:
+            if first_token is None:
+                first_token = time.perf_counter()
+            tokens.append(token)
+            if on_token:
+                on_token(token)
+        text = "".join(tokens)
+    else:
+        text = str(response)
+        if on_token:
+            on_token(text)
+    end = time.perf_counter()
+    first_token = first_token or end
+
+    retrieved = retrieval_timer.finished if retrieval_timer.started is not None else None
+    timings = {
+        'retrieval_s': retrieved - retrieval_timer.started if retrieved else 0.0,
+        # With streaming, query() returns once the prompt is built and the request is sent
+        'prompt_build_s': returned - retrieved if retrieved else 0.0,
+        'first_token_s': first_token - start,
+        'generation_s': end - first_token,
+        'total_s': end - start,
+    }
+    record('retrieval', timings['retrieval_s'])
+    record('llm_call', timings['total_s'] - timings['retrieval_s'])
+    return response, text, timings
+
+def _print_token(token):
+    sys.stdout.write(token)
+    sys.stdout.flush()
+
+def _print_timings(timings):
+    print()
+    print(" | ".join(f"{name[:-2]} {seconds:.2f}s" for name, seconds in timings.items()))
+
+def see_response(query_engine, query_str):
+    response, _, timings = stream_response(query_engine, query_str, on_token=_print_token)
+    _print_timings(timings)
+    return response
+
+def query_to_csv(query_engine, query_str, csv_path=QUERY_RESULTS_CSV):
+    # Appends the retrieved source rows as soon as they are known, then the answer with its timings
+    new_file = not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0
+    with open(csv_path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        if new_file:
+            writer.writeheader()
+        timestamp = datetime.now().isoformat(timespec='seconds')
+
+        def write_sources(response):
+            for node in getattr(response, 'source_nodes', None) or []:
+                writer.writerow({
+                    'timestamp': timestamp, 'query': query_str, 'kind': 'source',
+                    'file_name': node.metadata.get('file_name', ''),
+                    'score': node.score, 'text': node.get_content(),
+                })
+            f.flush()
+
+        response, text, timings = stream_response(query_engine, query_str, on_token=_print_token,
+                                                  on_response=write_sources)
+        writer.writerow({'timestamp': timestamp, 'query': query_str, 'kind': 'answer', 'text': text,
+                         **{name: f"{seconds:.3f}" for name, seconds in timings.items()}})
+        f.flush()
+    _print_timings(timings)
+    return response
@@ -0,0 +1,147 @@
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple
+import numpy as np
+from llama_index.core.base.response.schema import Response
+from config import (RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL,
+                    RESPONSE_CACHE_SIMILARITY)
+
+
+def normalize_query(query_str: str) -> str:
+    text = unicodedata.normalize('NFKC', query_str).lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.rstrip(' ?!.')
+
+
+class ResponseCache:
+    """LRU/TTL cache of answers, matched on normalized text or query-embedding similarity.
+
+    Entries are tied to an index version; loading the cache with a different version
+    (the CSVs or their metadata changed) starts from an empty cache.
+    """
+
+    def __init__(self, embed_model, index_version: str, path: Optional[str] = RESPONSE_CACHE_PATH,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL,
+                 similarity: float = RESPONSE_CACHE_SIMILARITY):
+        self.embed_model = embed_model
+        self.index_version = index_version
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('index_version') != self.index_version:
+            print("Index changed since the response cache was written, starting with an empty cache")
+            return
+        for key, entry in data.get('entries', []):
+            self._entries[key] = entry
+        self._evict_expired()
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'index_version': self.index_version, 'entries': list(self._entries.items())},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _evict_expired(self):
+        now = time.time()
+        expired = [key for key, entry in self._entries.items() if now - entry['created'] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        overflow = max(0, len(self._entries) - self.max_entries)
+        for _ in range(overflow):
+            self._entries.popitem(last=False)
+        if expired or overflow:
+            self._matrix = None
+
+    def _nearest(self, embedding) -> Tuple[Optional[str], float]:
+        if not self._entries:
+            return None, 0.0
+        if self._matrix is None:
+            keys = list(self._entries)
+            matrix = np.array([self._entries[key]['embedding'] for key in keys], dtype=np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+            self._matrix = (keys, matrix)
+        keys, matrix = self._matrix
+        query = np.asarray(embedding, dtype=np.float32)
+        scores = matrix @ (query / (np.linalg.norm(query) + 1e-12))
+        best = int(np.argmax(scores))
+        return keys[best], float(scores[best])
+
+    def lookup(self, query_str: str):
+        # Returns (response text, how it matched, query embedding); the embedding is reused by store()
+        key = normalize_query(query_str)
+        with self._lock:
+            self._evict_expired()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]['response'], 'exact', None
+        embedding = self.embed_model.get_query_embedding(query_str)
+        with self._lock:
+            nearest, score = self._nearest(embedding)
+            if nearest is not None and score >= self.similarity:
+                self._entries.move_to_end(nearest)
+                return self._entries[nearest]['response'], f'similar ({score:.3f})', embedding
+        return None, None, embedding
+
+    def store(self, query_str: str, response: str, embedding=None):
+        if embedding is None:
+            embedding = self.embed_model.get_query_embedding(query_str)
+        with self._lock:
+            self._entries[normalize_query(query_str)] = {
+                'query': query_str,
+                'embedding': list(map(float, embedding)),
+                'response': response,
+                'created': time.time(),
+            }
+            self._matrix = None
+            self._evict_expired()
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._save()
+
+
+class CachedQueryEngine:
+    def __init__(self, query_engine, cache: ResponseCache):
+        self.query_engine = query_engine
+        self.cache = cache
+
+    def query(self, query_str: str):
+        cached, match, embedding = self.cache.lookup(query_str)
+        if cached is not None:
+            return Response(response=cached, metadata={'cache': match})
+        response = self.query_engine.query(query_str)
+        if getattr(response, 'response_gen', None) is not None:
+            # Streaming answers are stored once the last token has been read
+            response.response_gen = self._store_when_done(query_str, response.response_gen, embedding)
+        else:
+            self.cache.store(query_str, str(response), embedding)
+        return response
+
+    def _store_when_done(self, query_str, tokens, embedding):
+        text = []
+        for token in tokens:
+            text.append(token)
+            yield token
+        self.cache.store(query_str, "".join(text), embedding)
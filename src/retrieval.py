@@ -0,0 +1,159 @@
+import calendar
+import re
+from datetime import date
+from typing import List, Optional, Tuple
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from src.keyword_index import KeywordIndex, RowFilters
+from config import SIMILARITY_TOP_K, HYBRID_CANDIDATES, RRF_K, KEYWORD_PIN_RATIO
+
+MONTHS = {
+    'january': 1, 'janvier': 1, 'february': 2, 'février': 2, 'fevrier': 2, 'march': 3, 'mars': 3,
+    'april': 4, 'avril': 4, 'may': 5, 'mai': 5, 'june': 6, 'juin': 6, 'july': 7, 'juillet': 7,
+    'august': 8, 'août': 8, 'aout': 8, 'september': 9, 'septembre': 9, 'october': 10, 'octobre': 10,
+    'november': 11, 'novembre': 11, 'december': 12, 'décembre': 12, 'decembre': 12,
+}
+# Each alternative yields an inclusive (first day, last day) span
+DATE_PATTERN = re.compile(
+    r"(?P<dmy>\b\d{1,2}/\d{1,2}/\d{4}\b)"
+    r"|(?P<iso>\b\d{4}-\d{2}-\d{2}\b)"
+    r"|(?P<month>\b(?:" + "|".join(MONTHS) + r")\s+\d{4}\b)"
+    r"|(?P<year>(?<![\w.,/-])(?:19|20)\d{2}(?![\w.,/-]))",
+    re.IGNORECASE,
+)
+AFTER_WORDS = re.compile(r"\b(after|since|après|apres|depuis|à partir du|a partir du)(\s+(the|le|la))?\s*$",
+                         re.IGNORECASE)
+BEFORE_WORDS = re.compile(r"\b(before|until|avant|jusqu'au|jusqu'à)(\s+(the|le|la))?\s*$", re.IGNORECASE)
+# A bare year is only a date right after one of these ("in 2021", "depuis 2020", "année 2019"),
+# otherwise "garage 2010" or "plus de 2000 dinars" would turn into date filters
+YEAR_CUES = re.compile(
+    r"\b(in|en|during|pendant|year|année|annee|l'année|l'annee|since|depuis|after|après|apres|"
+    r"before|avant|until|jusqu'en|between|entre)(\s+(the|l'|le|la))?\s*$",
+    re.IGNORECASE,
+)
+# ...or as the second date of a range, "entre 2020 et 2022", "in 2020 or 2021"
+YEAR_CONTINUATIONS = re.compile(r"\b(and|et|or|ou|to|au)\s*$|-\s*$", re.IGNORECASE)
+MIN_DATE, MAX_DATE = 10000101, 99991231
+
+
+def _key(day: date) -> int:
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def _span(match) -> Optional[Tuple[int, int]]:
+    text = match.group(0)
+    try:
+        if match.group('dmy'):
+            day, month, year = map(int, text.split('/'))
+            key = _key(date(year, month, day))
+            return key, key
+        if match.group('iso'):
+            year, month, day = map(int, text.split('-'))
+            key = _key(date(year, month, day))
+            return key, key
+        if match.group('month'):
+            name, year = text.lower().split()
+            year, month = int(year), MONTHS[name]
+            return _key(date(year, month, 1)), _key(date(year, month, calendar.monthrange(year, month)[1]))
+        year = int(text)
+        return year * 10000 + 101, year * 10000 + 1231
+    except ValueError:
+        return None
+
+
+def extract_date_range(query_str: str) -> Optional[Tuple[int, int]]:
+    spans = []
+    open_ended = False
+    previous_end = None
+    for match in DATE_PATTERN.finditer(query_str):
+        before = query_str[:match.start()]
+        if match.group('year') and not YEAR_CUES.search(before) and not (
+                previous_end is not None and YEAR_CONTINUATIONS.search(query_str[previous_end:match.start()])):
+            continue
+        span = _span(match)
+        if span is None:
+            continue
+        previous_end = match.end()
+        if AFTER_WORDS.search(before):
+            span, open_ended = (span[0], MAX_DATE), True
+        elif BEFORE_WORDS.search(before):
+            span, open_ended = (MIN_DATE, span[1]), True
+        spans.append(span)
+    if not spans:
+        return None
+    if open_ended:
+        # "after X", "after X and before Y": every bound applies
+        low, high = max(span[0] for span in spans), min(span[1] for span in spans)
+    else:
+        # "on X", "between X and Y", "du X au Y": everything the dates mention
+        low, high = min(span[0] for span in spans), max(span[1] for span in spans)
+    # Contradictory bounds ("after 2022 ... before 2020") would match nothing, filter on no date
+    return (low, high) if low <= high else None
+
+
+def extract_filters(query_str: str, file_names: List[str], date_columns: List[str]) -> RowFilters:
+    lowered = query_str.lower()
+    named_files = [name for name in file_names if name and name.lower() in lowered]
+    named_columns = [column for column in date_columns if column.lower() in lowered]
+    return RowFilters(
+        file_names=named_files,
+        date_range=extract_date_range(query_str),
+        # Without a DATE_* column named in the question, any date column may match
+        date_columns=named_columns or date_columns,
+    )
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses Chroma vector hits and BM25 keyword hits, both restricted by query pre-filters."""
+
+    def __init__(self, index, keyword_index: KeywordIndex, similarity_top_k: int = SIMILARITY_TOP_K,
+                 candidates: int = HYBRID_CANDIDATES, rrf_k: int = RRF_K, **kwargs):
+        super().__init__(**kwargs)
+        self.index = index
+        self.keyword_index = keyword_index
+        self.similarity_top_k = similarity_top_k
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self._file_names = keyword_index.file_names()
+        self._date_columns = keyword_index.date_columns()
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        filters = extract_filters(query_bundle.query_str, self._file_names, self._date_columns)
+        hits = self._search(query_bundle, filters)
+        if filters and len(hits) < self.similarity_top_k:
+            # The pre-filters read from the question may be wrong or too narrow; fill the
+            # remaining places from an unfiltered search rather than answer from nothing
+            found = {hit.node.node_id for hit in hits}
+            hits += [hit for hit in self._search(query_bundle, None) if hit.node.node_id not in found]
+        return hits[:self.similarity_top_k]
+
+    def _search(self, query_bundle: QueryBundle, filters: Optional[RowFilters]) -> List[NodeWithScore]:
+        query_str = query_bundle.query_str
+        retriever_kwargs = {'similarity_top_k': self.candidates}
+        if filters:
+            retriever_kwargs['vector_store_kwargs'] = {'where': filters.to_chroma_where()}
+        vector_hits = self.index.as_retriever(**retriever_kwargs).retrieve(query_bundle)
+        keyword_hits = self.keyword_index.search(query_str, self.candidates, filters)
+
+        # Reciprocal rank fusion keyed on the row document id
+        scores, nodes = {}, {}
+        for rank, hit in enumerate(vector_hits):
+            doc_id = hit.node.ref_doc_id or hit.node.node_id
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+            nodes.setdefault(doc_id, hit.node)
+        for rank, (doc_id, text, metadata, _) in enumerate(keyword_hits):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+            if doc_id not in nodes:
+                nodes[doc_id] = TextNode(
+                    id_=doc_id, text=text, metadata=metadata,
+                    excluded_embed_metadata_keys=list(metadata),
+                    excluded_llm_metadata_keys=[key for key in metadata if key != 'file_name'],
+                )
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        if keyword_hits and (len(keyword_hits) == 1 or keyword_hits[0][3] >= KEYWORD_PIN_RATIO * keyword_hits[1][3]):
+            # Rank fusion ignores how far ahead a BM25 hit is: a claim or policy number matching
+            # one row would lose to rows that are mediocre on both sides
+            ranked.remove(keyword_hits[0][0])
+            ranked.insert(0, keyword_hits[0][0])
+        ranked = ranked[:self.similarity_top_k]
+        return [NodeWithScore(node=nodes[doc_id], score=scores[doc_id]) for doc_id in ranked]
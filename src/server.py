@@ -0,0 +1,203 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Optional
+import httpx
+from llama_index.core.schema import MetadataMode
+from src.timing import record
+from config import (OLLAMA_BASE_URL, OLLAMA_MODEL, OLLAMA_CONCURRENCY, SERVER_HOST, SERVER_PORT,
+                    SERVER_QUEUE_LIMIT, QUERY_TIMEOUT)
+
+MAX_BODY_BYTES = 1 << 20
+LATENCY_WINDOW = 10000
+
+
+class Overloaded(Exception):
+    pass
+
+
+class OllamaClient:
+    """Async Ollama client sharing one connection pool, with bounded concurrency and queue."""
+
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, model: str = OLLAMA_MODEL,
+                 concurrency: int = OLLAMA_CONCURRENCY, queue_limit: int = SERVER_QUEUE_LIMIT):
+        self.model = model
+        self.queue_limit = queue_limit
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=None,  # Each request is bounded by the caller's deadline instead
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+    async def generate(self, prompt: str) -> str:
+        response = await self._client.post("/api/generate", json={
+            'model': self.model, 'prompt': prompt, 'stream': False,
+        })
+        response.raise_for_status()
+        return response.json()['response']
+
+    async def complete(self, prompt: str) -> str:
+        # Requests beyond the concurrency limit wait here; beyond the queue limit they are refused
+        if self.waiting >= self.queue_limit:
+            raise Overloaded(f"{self.waiting} requests already waiting for the model")
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            return await self.generate(prompt)
+        finally:
+            self._slots.release()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class QueryService:
+    """Answers queries against one shared retriever, index and embedding model."""
+
+    def __init__(self, retriever, text_qa_template, llm_client, timeout: float = QUERY_TIMEOUT):
+        self.retriever = retriever
+        self.text_qa_template = text_qa_template
+        self.llm_client = llm_client
+        self.timeout = timeout
+        self.started = time.perf_counter()
+        self.completed = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def answer(self, query_str: str) -> dict:
+        start = time.perf_counter()
+        # Query embedding and the vector search are blocking calls, keep them off the event loop
+        nodes = await asyncio.to_thread(self.retriever.retrieve, query_str)
+        retrieved = time.perf_counter()
+        # Same rendering as the CLI synthesizer: each row keeps its file_name for the schema lookup
+        context_str = "\n\n".join(node.get_content(metadata_mode=MetadataMode.LLM) for node in nodes)
+        prompt = self.text_qa_template.format(context_str=context_str, query_str=query_str)
+        answer = await self.llm_client.complete(prompt)
+        end = time.perf_counter()
+
+        self.completed += 1
+        self.latencies.append(end - start)
+        record('retrieval', retrieved - start)
+        record('llm_call', end - retrieved)
+        return {
+            'answer': answer,
+            'sources': [{'file_name': node.metadata.get('file_name', ''), 'score': node.score,
+                         'text': node.get_content(metadata_mode=MetadataMode.LLM)} for node in nodes],
+            'timings': {'retrieval_s': retrieved - start, 'generation_s': end - retrieved,
+                        'total_s': end - start},
+        }
+
+    def stats(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        stats = {'completed': self.completed, 'queries_per_second': self.completed / elapsed,
+                 'waiting': getattr(self.llm_client, 'waiting', 0)}
+        if self.latencies:
+            stats['p50_s'] = _percentile(self.latencies, 0.50)
+            stats['p99_s'] = _percentile(self.latencies, 0.99)
+        return stats
+
+
+async def _read_request(reader):
+    request_line = (await reader.readline()).decode('latin-1').strip()
+    if not request_line:
+        return None
+    method, path, _ = request_line.split(' ', 2)
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+async def _write_response(writer, status: int, payload: dict, keep_alive: bool):
+    reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error',
+               503: 'Service Unavailable', 504: 'Gateway Timeout'}
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+
+
+async def _handle(service: QueryService, method: str, path: str, body: bytes):
+    if method == 'GET' and path == '/health':
+        return 200, {'status': 'ok'}
+    if method == 'GET' and path == '/stats':
+        return 200, service.stats()
+    if method != 'POST' or path != '/query':
+        return 404, {'error': f"No route for {method} {path}"}
+    try:
+        request = json.loads(body or b'{}')
+        query_str = request['query']
+        timeout = float(request.get('timeout', service.timeout))
+    except (ValueError, KeyError, TypeError):
+        return 400, {'error': "Expected a JSON body with a 'query' field"}
+    try:
+        return 200, await asyncio.wait_for(service.answer(query_str), timeout)
+    except Overloaded as e:
+        return 503, {'error': str(e)}
+    except asyncio.TimeoutError:
+        return 504, {'error': f"Query did not finish within {timeout:.0f} s"}
+    except Exception as e:
+        return 500, {'error': str(e)}
+
+
+async def serve(service: QueryService, host: str = SERVER_HOST, port: int = SERVER_PORT,
+                ready: Optional[asyncio.Event] = None):
+    async def on_connection(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    await _write_response(writer, 400, {'error': "Malformed request"}, False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await _handle(service, method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await _write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(on_connection, host, port)
+    print(f"Serving queries on http://{host}:{port}/query")
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+
+def run_server(retriever, text_qa_template, host: str = SERVER_HOST, port: int = SERVER_PORT):
+    async def main():
+        llm_client = OllamaClient()
+        try:
+            await serve(QueryService(retriever, text_qa_template, llm_client), host, port)
+        finally:
+            await llm_client.aclose()
+
+    asyncio.run(main())
@@ -0,0 +1,282 @@
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Optional
+from llama_index.core import PromptTemplate
+from llama_index.core.base.response.schema import Response
+from src.data_loader import iter_row_blocks, normalize_date
+from config import STRUCTURED_DB_PATH, STRUCTURED_QUERY_TIMEOUT
+
+INTEGER_TYPES = {'int', 'integer', 'bigint'}
+REAL_TYPES = {'float', 'double', 'real', 'decimal', 'numeric', 'number', 'montant'}
+MAX_RESULT_ROWS = 200
+# SQLite VM instructions between two checks of the query deadline
+PROGRESS_INTERVAL = 10000
+# "00123": an identifier that would lose its leading zero as a number
+LEADING_ZERO = re.compile(r'^[+-]?0\d')
+
+SQL_PROMPT = PromptTemplate(
+    "You translate questions about automobile insurance claims into one SQLite query.\n"
+    "Tables:\n{schema}\n\n"
+    "Rules: answer with a single SELECT statement and nothing else. DATE_* columns hold "
+    "ISO dates ('YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'), use strftime('%Y-%m', column) "
+    "to group by month.\n\n"
+    "Question: {query_str}\n"
+    "SQL: "
+)
+
+# Aggregate, filter and group-by wording in English and French
+ANALYTICAL_PATTERN = re.compile(
+    r"\b(total|sum|count|how many|number of|average|mean|median|max(imum)?|min(imum)?|"
+    r"per|group(ed)? by|by (day|week|month|year|garage)|top \d+|distribution|"
+    r"combien|nombre|moyenne|somme|par (jour|mois|an|année|garage)|répartition|"
+    r"plus (grand|élevé|petit)s?)\b",
+    re.IGNORECASE,
+)
+
+
+def is_analytical(query_str: str) -> bool:
+    return bool(ANALYTICAL_PATTERN.search(query_str))
+
+
+def table_name(file_name: str) -> str:
+    name = re.sub(r'\W+', '_', Path(file_name).stem).strip('_') or 'claims'
+    return f"t_{name}" if name[0].isdigit() else name
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _to_number(cell: str, cast):
+    try:
+        return cast(cell.replace(' ', '').replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def _is_number(cell: str) -> bool:
+    return not LEADING_ZERO.match(cell) and _to_number(cell, float) is not None
+
+
+def _column_types(file: Path, headers: List[str], file_metadata: dict) -> List[str]:
+    declared = file_metadata.get('columns', {})
+    types = []
+    for header in headers:
+        declared_type = str(declared.get(header, {}).get('type', '')).lower()
+        if header.startswith("DATE_"):
+            types.append('TEXT')
+        elif declared_type in INTEGER_TYPES:
+            types.append('INTEGER')
+        elif declared_type in REAL_TYPES:
+            types.append('REAL')
+        elif declared_type:
+            types.append('TEXT')
+        else:
+            types.append(None)
+    undeclared = [j for j, column_type in enumerate(types) if column_type is None]
+    if undeclared:
+        # Guessed from every row: a text cell in the last block still makes the column TEXT
+        numeric = dict.fromkeys(undeclared, True)
+        seen = set()
+        for _, rows in iter_row_blocks(file):
+            for row in rows:
+                for j in undeclared:
+                    if numeric[j] and j < len(row) and row[j]:
+                        seen.add(j)
+                        numeric[j] = _is_number(row[j])
+        for j in undeclared:
+            types[j] = 'REAL' if numeric[j] and j in seen else 'TEXT'
+    return types
+
+
+class StructuredStore:
+    """Typed SQLite copy of the claim CSVs, one table per file, for aggregate questions."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with closing(sqlite3.connect(path)) as conn, conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS _files "
+                         "(file_name TEXT PRIMARY KEY, table_name TEXT, size INTEGER, mtime_ns INTEGER)")
+
+    def sync(self, csv_folder: str, metadata: Dict[str, dict]):
+        with closing(sqlite3.connect(self.path)) as conn:
+            known = {name: (size, mtime_ns, table) for name, table, size, mtime_ns
+                     in conn.execute("SELECT file_name, table_name, size, mtime_ns FROM _files")}
+            present = set()
+            for file in sorted(Path(csv_folder).glob('*.csv')):
+                present.add(file.name)
+                stat = file.stat()
+                if known.get(file.name, (None, None))[:2] == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                table = known[file.name][2] if file.name in known else self._free_table_name(conn, file.name)
+                rows = self._load_file(conn, file, table, metadata.get(file.name, {}))
+                conn.execute("INSERT OR REPLACE INTO _files VALUES (?, ?, ?, ?)",
+                             (file.name, table, stat.st_size, stat.st_mtime_ns))
+                conn.commit()
+                print(f"{file.name}: {rows} rows loaded into table {table}")
+            for file_name in set(known) - present:
+                conn.execute(f"DROP TABLE IF EXISTS {_quote(known[file_name][2])}")
+                conn.execute("DELETE FROM _files WHERE file_name = ?", (file_name,))
+                conn.commit()
+
+    @staticmethod
+    def _free_table_name(conn, file_name: str) -> str:
+        # "a-b.csv" and "a_b.csv" both map to a_b: the second one gets a_b_2
+        taken = {table.lower() for (table,) in conn.execute("SELECT table_name FROM _files")}
+        base = name = table_name(file_name)
+        suffix = 2
+        while name.lower() in taken:
+            name = f"{base}_{suffix}"
+            suffix += 1
+        return name
+
+    def _load_file(self, conn, file: Path, name: str, file_metadata: dict) -> int:
+        table = _quote(name)
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        loaded = 0
+        insert = None
+        invalid = {}
+
+        def number(column, cast):
+            def convert(cell):
+                value = _to_number(cell, cast)
+                if value is None:
+                    # Kept as text rather than NULL, and reported once the file is loaded
+                    invalid[column] = invalid.get(column, 0) + 1
+                    return cell
+                return value
+            return convert
+
+        for headers, rows in iter_row_blocks(file):
+            if insert is None:
+                types = _column_types(file, headers, file_metadata)
+                columns = ", ".join(f"{_quote(h)} {t}" for h, t in zip(headers, types))
+                conn.execute(f"CREATE TABLE {table} ({columns})")
+                insert = f"INSERT INTO {table} VALUES ({', '.join('?' * len(headers))})"
+                converters = []
+                for header, column_type in zip(headers, types):
+                    if header.startswith("DATE_"):
+                        converters.append(normalize_date)
+                    elif column_type == 'INTEGER':
+                        converters.append(number(header, int))
+                    elif column_type == 'REAL':
+                        converters.append(number(header, float))
+                    else:
+                        converters.append(str)
+            width = len(headers)
+            rows = [row[:width] + [''] * (width - len(row)) for row in rows if row]
+            conn.executemany(insert, (
+                [convert(cell) if cell != '' else None for convert, cell in zip(converters, row)]
+                for row in rows
+            ))
+            loaded += len(rows)
+        for column, count in invalid.items():
+            print(f"Warning: {file.name}: {count} non-numeric values in {column} kept as text, "
+                  f"SUM and AVG count them as 0")
+        return loaded
+
+    def describe(self, metadata: Optional[Dict[str, dict]] = None) -> str:
+        metadata = metadata or {}
+        with closing(sqlite3.connect(self.path)) as conn:
+            lines = []
+            for file_name, table in conn.execute("SELECT file_name, table_name FROM _files ORDER BY 1"):
+                descriptions = metadata.get(file_name, {}).get('columns', {})
+                lines.append(f"Table {table} (from {file_name}):")
+                for _, column, column_type, *_ in conn.execute(f"PRAGMA table_info({_quote(table)})"):
+                    description = descriptions.get(column, {}).get('description', '')
+                    lines.append(f"  {column} {column_type}" + (f" -- {description}" if description else ""))
+        return "\n".join(lines)
+
+    def _read_only_connection(self):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        tables = {table for (table,) in conn.execute("SELECT table_name FROM _files")}
+
+        def authorize(action, arg1, arg2, db_name, trigger):
+            if action == sqlite3.SQLITE_SELECT or action == sqlite3.SQLITE_FUNCTION:
+                return sqlite3.SQLITE_OK
+            if action == sqlite3.SQLITE_READ and arg1 in tables:
+                return sqlite3.SQLITE_OK
+            return sqlite3.SQLITE_DENY
+
+        conn.set_authorizer(authorize)
+        return conn
+
+    def run_sql(self, sql: str, timeout: float = STRUCTURED_QUERY_TIMEOUT):
+        conn = self._read_only_connection()
+        deadline = time.monotonic() + timeout
+        # A non-zero return aborts the statement with "interrupted", e.g. an unbounded cross join
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_INTERVAL)
+        try:
+            cursor = conn.execute(sql)
+            columns = [description[0] for description in cursor.description]
+            return columns, cursor.fetchmany(MAX_RESULT_ROWS)
+        finally:
+            conn.close()
+
+
+def extract_sql(completion: str) -> Optional[str]:
+    text = re.sub(r"```(?:sql)?", "", completion, flags=re.IGNORECASE).strip()
+    match = re.search(r"\b(SELECT|WITH)\b.*", text, re.IGNORECASE | re.DOTALL)
+    if not match:
+        return None
+    sql = match.group(0).strip().rstrip(';').strip()
+    # A single statement only: anything after an inner ';' is rejected rather than executed
+    return None if ';' in sql else sql
+
+
+def format_table(columns: List[str], rows: List[tuple]) -> str:
+    lines = [" | ".join(columns)]
+    lines.extend(" | ".join("" if value is None else str(value) for value in row) for row in rows)
+    if len(rows) == MAX_RESULT_ROWS:
+        lines.append(f"(first {MAX_RESULT_ROWS} rows)")
+    return "\n".join(lines)
+
+
+class StructuredQueryEngine:
+    def __init__(self, store: StructuredStore, llm, metadata: Optional[Dict[str, dict]] = None):
+        self.store = store
+        self.llm = llm
+        self.schema = store.describe(metadata)
+
+    def query(self, query_str: str) -> Response:
+        completion = self.llm.complete(SQL_PROMPT.format(schema=self.schema, query_str=query_str))
+        sql = extract_sql(completion.text)
+        if sql is None:
+            raise ValueError(f"No SQL statement in completion: {completion.text}")
+        start = time.perf_counter()
+        # Unknown tables or columns and anything but reads fail here, before any row is touched
+        columns, rows = self.store.run_sql(sql)
+        elapsed = time.perf_counter() - start
+        return Response(
+            response=format_table(columns, rows),
+            metadata={'sql': sql, 'sql_seconds': elapsed, 'row_count': len(rows)},
+        )
+
+
+def setup_structured_store(csv_folder: str, metadata: Dict[str, dict],
+                           path: str = STRUCTURED_DB_PATH, sync: bool = True) -> StructuredStore:
+    store = StructuredStore(path)
+    if sync:
+        store.sync(csv_folder, metadata)
+    return store
+
+
+class ClaimsQueryRouter:
+    """Sends aggregate, filter and group-by questions to SQL, everything else to the vector index."""
+
+    def __init__(self, vector_engine, structured_engine: Optional[StructuredQueryEngine] = None):
+        self.vector_engine = vector_engine
+        self.structured_engine = structured_engine
+
+    def query(self, query_str: str):
+        if self.structured_engine is not None and is_analytical(query_str):
+            try:
+                return self.structured_engine.query(query_str)
+            except Exception as e:
+                print(f"Structured query failed, falling back to vector search: {e}")
+        return self.vector_engine.query(query_str)
@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+
+
+class StageTimings:
+    """Calls, items and wall time per named pipeline stage, updated from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, list] = {}
+
+    def add(self, stage: str, seconds: float, items: int = 1):
+        with self._lock:
+            totals = self._stages.setdefault(stage, [0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += items
+            totals[2] += seconds
+
+    @contextmanager
+    def time(self, stage: str, items: int = 1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, items)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {'calls': calls, 'items': items, 'seconds': seconds,
+                        'items_per_second': items / seconds if seconds else 0.0}
+                for stage, (calls, items, seconds) in self._stages.items()
+            }
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+# Stages are only timed while a StageTimings is enabled; otherwise the hooks cost nothing
+_active: Optional[StageTimings] = None
+
+
+def enable_timings(timings: Optional[StageTimings] = None) -> StageTimings:
+    global _active
+    _active = timings or StageTimings()
+    return _active
+
+
+def disable_timings():
+    global _active
+    _active = None
+
+
+def record(stage: str, seconds: float, items: int = 1):
+    # For durations the caller already measured
+    if _active is not None:
+        _active.add(stage, seconds, items)
+
+
+@contextmanager
+def timed(stage: str, items: int = 1):
+    timings = _active
+    if timings is None:
+        yield
+        return
+    with timings.time(stage, items):
+        yield
+
+
+def timed_iter(stage: str, iterable: Iterable) -> Iterator:
+    """Yields from iterable, timing the production of each item; sized items count as their length."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        record(stage, time.perf_counter() - start, len(item) if hasattr(item, '__len__') else 1)
+        yield item
@@ -1,28 +1,202 @@
-from llama_index.core import VectorStoreIndex, StorageContext
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+import json
+from collections import Counter
+from pathlib import Path
+from llama_index.core import VectorStoreIndex, Settings
+from llama_index.core.indices.utils import embed_nodes
 from llama_index.vector_stores.chroma import ChromaVectorStore
 import chromadb
-from src.data_loader import load_csv_directory
+from src.compact_store import CompactVectorStore, compact_store_path
+from src.data_loader import ImprovedCSVReader, prefetch
+from src.embeddings import build_embed_model
 from src.document_processor import load_metadata, enhance_documents_with_metadata
-from config import CHROMA_DB_PATH, CHROMA_COLLECTION_NAME
+from src.keyword_index import KeywordIndex, keyword_index_path
+from src.manifest import IndexManifest, manifest_path, hash_file, hash_text, row_ids
+from src.timing import timed, timed_iter
+from config import (CHROMA_DB_PATH, CHROMA_COLLECTION_NAME, INGEST_BATCH_SIZE, INGEST_PREFETCH_BATCHES,
+                    CSV_COLUMNAR, CSV_WORKERS, CSV_CHUNK_BYTES, INLINE_SCHEMA, HYBRID_RETRIEVAL,
+                    VECTOR_BACKEND, CHUNK_ROWS, CHUNK_KEY)
 
-def setup_vector_store(csv_folder):
-    csv_documents = load_csv_directory(csv_folder)
+DELETE_BATCH_SIZE = 5000
+
+
+def index_name(collection_name, backend=VECTOR_BACKEND):
+    # Each backend keeps its own manifest and keyword index, so switching triggers a full build
+    return collection_name if backend == 'chroma' else f"{collection_name}_{backend}"
+
+
+def _open_store(db_path, collection_name, backend, rebuild=False):
+    if backend == 'compact':
+        vector_store = CompactVectorStore(compact_store_path(db_path, collection_name))
+        if rebuild:
+            vector_store.clear()
+        return vector_store
+    if backend != 'chroma':
+        raise ValueError(f"Unknown vector backend '{backend}', expected 'chroma' or 'compact'")
+    db = chromadb.PersistentClient(path=db_path)
+    if rebuild:
+        db.delete_collection(collection_name)
+    return ChromaVectorStore(chroma_collection=db.get_or_create_collection(collection_name))
+
+
+def _count(vector_store):
+    if isinstance(vector_store, CompactVectorStore):
+        return vector_store.count()
+    return vector_store.client.count()
+
+
+def _delete_rows(vector_store, ids, keyword_index=None):
+    ids = list(ids)
+    for start in range(0, len(ids), DELETE_BATCH_SIZE):
+        batch = ids[start:start + DELETE_BATCH_SIZE]
+        if isinstance(vector_store, CompactVectorStore):
+            vector_store.delete_many(batch)
+        else:
+            vector_store.client.delete(where={"document_id": {"$in": batch}})
+    if keyword_index is not None and ids:
+        keyword_index.delete(ids)
+
+
+def _insert_rows(index, documents, keyword_index=None):
+    if documents:
+        nodes = Settings.node_parser.get_nodes_from_documents(documents)
+        # Embedded here rather than inside insert_nodes so the two stages are timed apart
+        with timed('embedding', len(nodes)):
+            embeddings = embed_nodes(nodes, index._embed_model)
+        for node in nodes:
+            node.embedding = embeddings[node.node_id]
+        with timed('vector_insert', len(nodes)):
+            index.insert_nodes(nodes)
+        if keyword_index is not None:
+            with timed('keyword_insert', len(documents)):
+                keyword_index.add(documents)
+
+
+def _sync_file(index, vector_store, keyword_index, reader, file, metadata, inline_schema, known):
+    seen = Counter()
+
+    def prepared_batches():
+        for batch in timed_iter('csv_parse', reader.iter_batches(file, INGEST_BATCH_SIZE)):
+            with timed('metadata', len(batch)):
+                documents = enhance_documents_with_metadata(batch, metadata, inline_schema)
+            batch_ids = row_ids(file.name, [doc.text for doc in documents], seen)
+            new_documents = []
+            for doc, doc_id in zip(documents, batch_ids):
+                if doc_id not in known:
+                    doc.id_ = doc_id
+                    new_documents.append(doc)
+            yield batch_ids, new_documents
+
+    # Parsing runs ahead on a background thread while the current batch is embedded and inserted
+    ids = []
+    embedded = 0
+    for batch_ids, new_documents in prefetch(prepared_batches(), INGEST_PREFETCH_BATCHES):
+        ids.extend(batch_ids)
+        # New ids are deleted first so a run interrupted before the manifest save can be replayed
+        _delete_rows(vector_store, [doc.id_ for doc in new_documents], keyword_index)
+        _insert_rows(index, new_documents, keyword_index)
+        embedded += len(new_documents)
+
+    removed = known.difference(ids)
+    _delete_rows(vector_store, removed, keyword_index)
+    return ids, embedded, len(removed)
+
+
+def sync_vector_store(index, vector_store, csv_folder, metadata, manifest, inline_schema=INLINE_SCHEMA,
+                      keyword_index=None, chunk_rows=CHUNK_ROWS, chunk_key=CHUNK_KEY):
+    # With an inline schema a metadata.json change rewrites every row text, and a new
+    # chunking changes every document, so no file can be skipped on its stat alone
+    layout = [inline_schema, metadata if inline_schema else None]
+    if chunk_rows > 1:
+        layout.append([chunk_rows, chunk_key])
+    metadata_hash = hash_text(json.dumps(layout, sort_keys=True))
+    metadata_changed = metadata_hash != manifest.metadata_hash
+    present = set()
+
+    with ImprovedCSVReader(columnar=CSV_COLUMNAR, workers=CSV_WORKERS, chunk_bytes=CSV_CHUNK_BYTES,
+                           chunk_rows=chunk_rows, chunk_key=chunk_key) as reader:
+        for file in sorted(Path(csv_folder).glob('*.csv')):
+            present.add(file.name)
+            stat = file.stat()
+            if not metadata_changed and manifest.is_unchanged(file, stat):
+                continue
+
+            sha256 = hash_file(file)
+            if not metadata_changed and manifest.files.get(file.name, {}).get('sha256') == sha256:
+                manifest.update(file, stat, sha256)
+                continue
+
+            ids, embedded, removed = _sync_file(index, vector_store, keyword_index, reader, file,
+                                                metadata, inline_schema, set(manifest.rows(file.name)))
+            print(f"{file.name}: {embedded} rows embedded, {removed} rows removed")
+
+            manifest.update(file, stat, sha256, ids)
+
+    for file_name in sorted(set(manifest.files) - present):
+        _delete_rows(vector_store, manifest.rows(file_name), keyword_index)
+        manifest.remove(file_name)
+        print(f"{file_name}: removed from index")
+
+    manifest.metadata_hash = metadata_hash
+    manifest.save()
+
+
+def load_manifest(db_path=CHROMA_DB_PATH, collection_name=CHROMA_COLLECTION_NAME, backend=VECTOR_BACKEND):
+    return IndexManifest.load(manifest_path(db_path, index_name(collection_name, backend)))
+
+
+def index_fingerprint(csv_folder, db_path=CHROMA_DB_PATH, collection_name=CHROMA_COLLECTION_NAME,
+                      backend=VECTOR_BACKEND, manifest=None):
+    # Changes whenever indexed CSV content or the metadata shown to the model changes
+    if manifest is None:
+        manifest = load_manifest(db_path, collection_name, backend)
+    return hash_text(manifest.fingerprint() + json.dumps(load_metadata(csv_folder), sort_keys=True))
+
+
+def open_vector_store(embed_model=None, db_path=CHROMA_DB_PATH, collection_name=CHROMA_COLLECTION_NAME,
+                      keyword_index=None, backend=VECTOR_BACKEND, manifest=None):
+    # Opens the collection as of the last sync without reading the CSV folder.
+    # Returns None when there is nothing usable to open and a full setup is needed.
+    if manifest is None:
+        manifest = load_manifest(db_path, collection_name, backend)
+    if not manifest.files or (keyword_index is not None and keyword_index.created):
+        return None
+    vector_store = _open_store(db_path, collection_name, backend)
+    if _count(vector_store) == 0:
+        return None
+    return VectorStoreIndex.from_vector_store(vector_store, embed_model=embed_model)
+
+
+def setup_vector_store(csv_folder, embed_model=None, db_path=CHROMA_DB_PATH,
+                       collection_name=CHROMA_COLLECTION_NAME, inline_schema=INLINE_SCHEMA,
+                       keyword_index=None, backend=VECTOR_BACKEND, chunk_rows=CHUNK_ROWS, chunk_key=CHUNK_KEY):
     metadata = load_metadata(csv_folder)
-    enhanced_documents = enhance_documents_with_metadata(csv_documents, metadata)
+    if embed_model is None:
+        embed_model = build_embed_model(db_path)
+
+    if keyword_index is None and HYBRID_RETRIEVAL:
+        keyword_index = KeywordIndex(keyword_index_path(db_path, index_name(collection_name, backend)))
 
-    embed_model = HuggingFaceEmbedding()
+    manifest = load_manifest(db_path, collection_name, backend)
+    vector_store = _open_store(db_path, collection_name, backend)
+    if not manifest.exists() and _count(vector_store) > 0:
+        # Vectors written before the manifest existed cannot be matched to rows
+        print(f"Rebuilding collection '{collection_name}': no index manifest found")
+        vector_store = _open_store(db_path, collection_name, backend, rebuild=True)
+        if keyword_index is not None:
+            keyword_index.clear()
 
-    db = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-    chroma_collection = db.get_or_create_collection(CHROMA_COLLECTION_NAME)
+    if keyword_index is not None and keyword_index.created and manifest.files:
+        # The manifest says rows are indexed but the keyword index has none of them
+        print("Keyword index missing, re-indexing every file")
+        manifest.clear()
 
-    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
+    index = VectorStoreIndex.from_vector_store(vector_store, embed_model=embed_model)
 
-    index = VectorStoreIndex.from_documents(
-        enhanced_documents,
-        storage_context=storage_context,
-        embed_model=embed_model,
-    )
+    sync_vector_store(index, vector_store, csv_folder, metadata, manifest, inline_schema, keyword_index,
+                      chunk_rows, chunk_key)
+    if getattr(embed_model, 'embeddings_per_second', 0):
+        stats = embed_model.stats()
+        print(f"Embedded {stats['embedded']} rows at {stats['embeddings_per_second']:.1f}/s "
+              f"({stats['cache_hits']} served from cache)")
 
     return index
@@ -0,0 +1,63 @@
+import numpy as np
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from src.compact_store import CompactVectorStore, where_sql
+from src.keyword_index import RowFilters
+
+
+def make_nodes(count, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    nodes = []
+    for i in range(count):
+        day = 20200101 + (i % 28)
+        metadata = {'file_name': f"claims_{i % 3}.csv", 'DATE_SURVENANCE_from': day, 'DATE_SURVENANCE_to': day,
+                    'GARAGE': f"garage {i % 5}"}
+        nodes.append(TextNode(id_=f"n{i}", text=f"row {i}", metadata=metadata, embedding=rng.normal(size=dim).tolist(),
+                              relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=f"doc{i}")}))
+    return nodes
+
+
+def query(store, embedding, top_k=5, where=None):
+    return store.query(VectorStoreQuery(query_embedding=list(embedding), similarity_top_k=top_k), where=where)
+
+
+def test_nearest_rows_and_deletes(tmp_path):
+    store = CompactVectorStore(str(tmp_path / "compact"))
+    nodes = make_nodes(300)
+    store.add(nodes)
+    assert store.count() == 300
+
+    result = query(store, nodes[42].embedding, top_k=1)
+    assert result.ids == ["n42"] and abs(result.similarities[0] - 1.0) < 1e-5
+
+    store.delete_many([node.ref_doc_id for node in nodes[:100]])
+    assert store.count() == 200
+    assert "n42" not in query(store, nodes[42].embedding, top_k=5).ids
+
+
+def test_filters_match_metadata(tmp_path):
+    store = CompactVectorStore(str(tmp_path / "compact"))
+    nodes = make_nodes(300)
+    store.add(nodes)
+    where = RowFilters(['claims_1.csv'], (20200105, 20200110), ['DATE_SURVENANCE']).to_chroma_where()
+    where = {'$and': [where, {'GARAGE': {'$ne': 'garage 0'}}]}
+    expected = {node.node_id for node in nodes
+                if node.metadata['file_name'] == 'claims_1.csv'
+                and 20200105 <= node.metadata['DATE_SURVENANCE_from'] <= 20200110
+                and node.metadata['GARAGE'] != 'garage 0'}
+
+    result = query(store, nodes[0].embedding, top_k=300, where=where)
+    assert set(result.ids) == expected
+
+    # Reopened without the row_values index: it is rebuilt from the stored metadata
+    store.client.executescript("DELETE FROM row_values; DELETE FROM info WHERE key = 'row_values';")
+    reopened = CompactVectorStore(str(tmp_path / "compact"))
+    assert set(query(reopened, nodes[0].embedding, top_k=300, where=where).ids) == expected
+
+
+def test_file_and_date_filters_use_the_index(tmp_path):
+    store = CompactVectorStore(str(tmp_path / "compact"))
+    store.add(make_nodes(10))
+    sql, params = where_sql(RowFilters(['claims_1.csv'], (20200105, 20200110), ['DATE_SURVENANCE']).to_chroma_where())
+    plan = " ".join(row[-1] for row in store.client.execute("EXPLAIN QUERY PLAN " + sql, params))
+    assert "json_extract" not in sql and "SCAN rows" not in plan
@@ -0,0 +1,32 @@
+import pytest
+from benchmarks.synthetic import write_claims_csv
+from src.data_loader import ImprovedCSVReader
+
+
+def parse(file, **options):
+    with ImprovedCSVReader(**options) as reader:
+        return [(doc.text, doc.metadata) for doc in reader.iter_documents(file)]
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 7])
+def test_parsing_modes_give_identical_documents(tmp_path, chunk_rows):
+    file = tmp_path / "claims.csv"
+    write_claims_csv(file, 3000)
+
+    row_wise = parse(file, columnar=False, chunk_rows=chunk_rows)
+    assert len(row_wise) == -(-3000 // chunk_rows)
+    assert parse(file, columnar=True, block_size=256, chunk_rows=chunk_rows) == row_wise
+    # Small byte ranges, so rows are split across many chunks and two worker processes
+    assert parse(file, columnar=True, workers=2, chunk_bytes=16 << 10, chunk_rows=chunk_rows) == row_wise
+
+
+def test_quoted_fields_spanning_lines_are_not_split(tmp_path):
+    file = tmp_path / "claims.csv"
+    lines = ["NUM_SINISTRE;GARAGE;DATE_SURVENANCE"]
+    lines += [f'SIN{i};"Garage ""{i}"";\nsuite";01/02/2021' if i % 3 == 0 else f"SIN{i};Auto;01/02/2021"
+              for i in range(3000)]
+    file.write_text("\n".join(lines) + "\n", encoding='latin-1')
+
+    row_wise = parse(file, columnar=False)
+    assert len(row_wise) == 3000
+    assert parse(file, columnar=True, workers=2, chunk_bytes=4096) == row_wise
@@ -0,0 +1,51 @@
+import chromadb
+from llama_index.core import MockEmbedding
+from benchmarks.synthetic import write_claims_folder, mutate_claims_csv
+from src.vector_store import setup_vector_store, open_vector_store, load_manifest, _count
+
+
+class CountingEmbedding(MockEmbedding):
+    calls: int = 0
+
+    def _get_text_embeddings(self, texts):
+        self.calls += len(texts)
+        return super()._get_text_embeddings(texts)
+
+
+def sync(csv_folder, db_path):
+    embed_model = CountingEmbedding(embed_dim=8)
+    index = setup_vector_store(str(csv_folder), embed_model=embed_model, db_path=str(db_path),
+                               collection_name="test")
+    return embed_model.calls, _count(index.vector_store)
+
+
+def test_incremental_sync(tmp_path):
+    csv_folder, db_path = tmp_path / "csv", tmp_path / "db"
+    write_claims_folder(csv_folder, 3, 40)
+
+    assert sync(csv_folder, db_path) == (120, 120)
+    assert sync(csv_folder, db_path) == (0, 120)
+
+    # 4 rows rewritten, 4 dropped and 4 appended: at most those 8 new row texts are embedded
+    mutate_claims_csv(csv_folder / "claims_001.csv", 0.1)
+    embedded, count = sync(csv_folder, db_path)
+    assert 4 <= embedded <= 8 and count == 120
+
+    (csv_folder / "claims_002.csv").unlink()
+    assert sync(csv_folder, db_path) == (0, 80)
+    assert sorted(load_manifest(str(db_path), "test").files) == ["claims_000.csv", "claims_001.csv"]
+
+
+def test_collection_without_manifest_is_rebuilt(tmp_path):
+    csv_folder, db_path = tmp_path / "csv", tmp_path / "db"
+    write_claims_folder(csv_folder, 1, 30)
+    # Vectors from before the manifest existed, which cannot be matched to rows
+    collection = chromadb.PersistentClient(path=str(db_path)).get_or_create_collection("test")
+    collection.add(ids=[f"legacy-{i}" for i in range(50)], embeddings=[[0.1] * 8] * 50)
+
+    # A fast start that finds nothing to open must not make the manifest look present
+    assert open_vector_store(db_path=str(db_path), collection_name="test",
+                             manifest=load_manifest(str(db_path), "test")) is None
+    assert not load_manifest(str(db_path), "test").exists()
+
+    assert sync(csv_folder, db_path) == (30, 30)
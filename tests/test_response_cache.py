@@ -0,0 +1,68 @@
+import re
+import time
+from llama_index.core.base.response.schema import Response
+from src.response_cache import ResponseCache, CachedQueryEngine
+
+
+class WordEmbedding:
+    # Bag of known words: questions sharing their words are similar
+    WORDS = ["total", "garage", "ennasr", "sfax", "2021", "montant"]
+
+    def get_query_embedding(self, query_str):
+        words = re.findall(r'\w+', query_str.lower())
+        return [float(word in words) for word in self.WORDS]
+
+
+class CountingEngine:
+    def __init__(self):
+        self.queries = []
+
+    def query(self, query_str):
+        self.queries.append(query_str)
+        return Response(response=f"answer {len(self.queries)}")
+
+
+def test_exact_and_similar_hits(tmp_path):
+    cache = ResponseCache(WordEmbedding(), "v1", path=str(tmp_path / "cache.json"), similarity=0.95)
+    engine = CountingEngine()
+    cached = CachedQueryEngine(engine, cache)
+
+    assert str(cached.query("Total montant garage Ennasr?")) == "answer 1"
+    assert cached.query("  total MONTANT garage ennasr ").metadata['cache'] == 'exact'
+    assert cached.query("montant total, garage ennasr").metadata['cache'].startswith('similar')
+    assert str(cached.query("Total montant garage Sfax?")) == "answer 2"
+    assert len(engine.queries) == 2
+
+
+def test_entries_persist_per_index_version(tmp_path):
+    path = str(tmp_path / "cache.json")
+    ResponseCache(WordEmbedding(), "v1", path=path).store("total garage sfax", "42")
+
+    assert ResponseCache(WordEmbedding(), "v1", path=path).lookup("total garage sfax")[0] == "42"
+    # The CSVs changed: answers from the old index are not served
+    assert ResponseCache(WordEmbedding(), "v2", path=path).lookup("total garage sfax")[0] is None
+
+
+def test_expiry_and_size_limit(tmp_path):
+    cache = ResponseCache(WordEmbedding(), "v1", path=None, max_entries=2, ttl=60)
+    for query_str in ["total 2021", "garage sfax", "montant ennasr"]:
+        cache.store(query_str, query_str.upper())
+    assert cache.lookup("total 2021")[0] is None
+    assert cache.lookup("montant ennasr")[0] == "MONTANT ENNASR"
+
+    cache._entries["montant ennasr"]['created'] = time.time() - 61
+    assert cache.lookup("montant ennasr")[0] is None
+
+
+def test_streamed_answers_are_stored_once_read(tmp_path):
+    class StreamingEngine:
+        def query(self, query_str):
+            response = Response(response=None)
+            response.response_gen = iter(["12", " claims"])
+            return response
+
+    cache = ResponseCache(WordEmbedding(), "v1", path=None)
+    response = CachedQueryEngine(StreamingEngine(), cache).query("total garage sfax")
+    assert cache.lookup("total garage sfax")[0] is None
+    assert "".join(response.response_gen) == "12 claims"
+    assert cache.lookup("total garage sfax")[0] == "12 claims"
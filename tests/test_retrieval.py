@@ -0,0 +1,55 @@
+from llama_index.core import MockEmbedding
+from llama_index.core.schema import QueryBundle
+from benchmarks.synthetic import write_claims_folder
+from src.keyword_index import KeywordIndex, keyword_index_path
+from src.retrieval import HybridRetriever, extract_date_range, MAX_DATE, MIN_DATE
+from src.vector_store import setup_vector_store
+
+
+def test_bare_numbers_are_not_dates():
+    assert extract_date_range("garage 2010 claims") is None
+    assert extract_date_range("montant supérieur à 2000 dinars") is None
+
+
+def test_year_after_cue():
+    assert extract_date_range("claims in 2021") == (20210101, 20211231)
+    assert extract_date_range("sinistres en 2019") == (20190101, 20191231)
+    assert extract_date_range("l'année 2020") == (20200101, 20201231)
+
+
+def test_month_and_full_dates():
+    assert extract_date_range("sinistres de mars 2021") == (20210301, 20210331)
+    assert extract_date_range("accident du 12/03/2021") == (20210312, 20210312)
+    assert extract_date_range("on 2021-02-28") == (20210228, 20210228)
+
+
+def test_year_range():
+    assert extract_date_range("entre 2020 et 2022") == (20200101, 20221231)
+    assert extract_date_range("between march 2020 and 2021") == (20200301, 20211231)
+
+
+def test_open_ended():
+    assert extract_date_range("depuis 2019") == (20190101, MAX_DATE)
+    assert extract_date_range("before may 2022") == (MIN_DATE, 20220531)
+    assert extract_date_range("after may 2022 but not 2020") == (20220501, MAX_DATE)
+
+
+def test_inverted_range_is_dropped():
+    assert extract_date_range("after 2022 and before 2020") is None
+
+
+def test_exact_claim_id_ranks_first(tmp_path):
+    csv_folder, db_path = tmp_path / "csv", str(tmp_path / "db")
+    write_claims_folder(csv_folder, 2, 30)
+    keyword_index = KeywordIndex(keyword_index_path(db_path, "test"))
+    index = setup_vector_store(str(csv_folder), embed_model=MockEmbedding(embed_dim=8), db_path=db_path,
+                               collection_name="test", keyword_index=keyword_index)
+
+    # "sinistre" is in every row through NUM_SINISTRE and must not match them all
+    hits = keyword_index.search("Sinistre SIN000000005", 20)
+    assert len(hits) == 1 and "SIN000000005" in hits[0][1]
+
+    retriever = HybridRetriever(index, keyword_index, similarity_top_k=2)
+    for _ in range(3):
+        nodes = retriever.retrieve(QueryBundle("Sinistre SIN000000005"))
+        assert "SIN000000005" in nodes[0].node.get_content()
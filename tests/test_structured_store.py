@@ -0,0 +1,73 @@
+import sqlite3
+import pytest
+from benchmarks.synthetic import write_claims_folder
+from src.structured_store import StructuredStore
+
+
+def write_csv(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding='latin-1')
+
+
+@pytest.fixture
+def store(tmp_path):
+    csv_folder = tmp_path / "csv"
+    write_claims_folder(csv_folder, 1, 50)
+    store = StructuredStore(str(tmp_path / "claims.sqlite"))
+    store.sync(str(csv_folder), {})
+    return store
+
+
+def test_reads_are_allowed(store):
+    columns, rows = store.run_sql("SELECT COUNT(*), SUM(MONTANT) FROM claims_000")
+    assert columns == ["COUNT(*)", "SUM(MONTANT)"] and rows[0][0] == 50 and rows[0][1] > 0
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM claims_000",
+    "UPDATE claims_000 SET MONTANT = 0",
+    "DROP TABLE claims_000",
+    "SELECT * FROM _files",
+    "SELECT * FROM sqlite_master",
+    "ATTACH DATABASE ':memory:' AS other",
+    "PRAGMA table_info(claims_000)",
+])
+def test_authorizer_denies_everything_but_claim_reads(store, sql):
+    with pytest.raises(sqlite3.DatabaseError):
+        store.run_sql(sql)
+    assert store.run_sql("SELECT COUNT(*) FROM claims_000")[1] == [(50,)]
+
+
+def test_runaway_query_is_interrupted(store):
+    cross_join = "SELECT COUNT(*) FROM claims_000 a, claims_000 b, claims_000 c, claims_000 d, claims_000 e"
+    with pytest.raises(sqlite3.OperationalError, match="interrupted"):
+        store.run_sql(cross_join, timeout=0.2)
+
+
+def test_types_come_from_every_row(tmp_path):
+    csv_folder = tmp_path / "csv"
+    csv_folder.mkdir()
+    # 5000 rows: the text value of NOTE and the leading zero of CODE come after the first block
+    lines = ["CODE;NOTE;MONTANT"] + [f"{1000 + i};{i};{i}.5" for i in range(5000)]
+    lines += ["00123;n/a;abc"]
+    write_csv(csv_folder / "claims.csv", lines)
+    store = StructuredStore(str(tmp_path / "claims.sqlite"))
+    store.sync(str(csv_folder), {"claims.csv": {"columns": {"MONTANT": {"type": "float"}}}})
+
+    assert "CODE TEXT" in store.describe() and "NOTE TEXT" in store.describe()
+    assert store.run_sql("SELECT CODE, NOTE, MONTANT FROM claims WHERE CODE = '00123'")[1] == [
+        ("00123", "n/a", "abc")]
+    # Only the declared column keeps its type, and its bad cell is not dropped
+    assert store.run_sql("SELECT COUNT(MONTANT) FROM claims")[1] == [(5001,)]
+
+
+def test_clashing_table_names_get_a_suffix(tmp_path):
+    csv_folder = tmp_path / "csv"
+    csv_folder.mkdir()
+    write_csv(csv_folder / "a-b.csv", ["X", "1"])
+    write_csv(csv_folder / "a_b.csv", ["X", "2", "3"])
+    store = StructuredStore(str(tmp_path / "claims.sqlite"))
+    store.sync(str(csv_folder), {})
+    store.sync(str(csv_folder), {})
+
+    assert store.run_sql("SELECT COUNT(*) FROM a_b")[1] == [(1,)]
+    assert store.run_sql("SELECT COUNT(*) FROM a_b_2")[1] == [(2,)]